@@ -1,4 +1,5 @@
 import json
+import wave
 import os.path
 import time
 import logging
@@ -14,9 +15,9 @@ import types
 import typing
 import hashlib
 from importlib import import_module
+from collections import defaultdict
 from pathlib import Path
 from multiprocessing import Process
-from playsound import playsound
 
 from pynput.keyboard import Controller as Keyboard
 from pynput.keyboard import Key as KeyboardKey
@@ -25,13 +26,17 @@ from pynput.mouse import Controller as Mouse
 from pynput.mouse import Button as MouseButton
 
 from data.constants import PROJECT_DIR, CONFIG_FILE, CONFIG_DIR, PLUGINS_DIR
-from audio.tts import TTS
+from audio.tts import TTS, Warmup, SpeechWorker, split_sentences
+from audio.output import Clip, ClipArchive, PcmCache, AudioOutput
 from utils import load_yaml, filter_lang_config, load_lang, notify, sanitize_filename, parse_config_answers
 
 from .commands.tree import Manager
-from .commands.scenarios import Trigger, Timeline, Scenario
-from .events.events import Event, EventLogger
-from .locales.service import Locale, LocaleService
+from .commands.fuzzy import FuzzyIndex
+from .commands.callbacks import action_invoker
+from .commands.scenarios import Trigger, Timeline, Scenario, ScenarioRegistry
+from .events.events import Event, EventType, EventLogger
+from .events.journal import EventJournal
+from .locales.service import Locale, LocaleService, Rendered, template_segments
 from .files.caching import Runtime
 
 log = logging.getLogger("API: app")
@@ -214,12 +219,14 @@ class AppAPI:
 
         self.manager = Manager()
         self.Command = self.manager.Command
+        self.FuzzyIndex = FuzzyIndex
 
         self.Trigger = Trigger
         self.Timeline = Timeline
         self.Scenario = Scenario
 
         self.Event = Event
+        self.EventType = EventType
         self.eventLogger = EventLogger()
 
         self.mouse = Mouse()
@@ -237,6 +244,29 @@ class AppAPI:
 
         self.config = self.get_config()
 
+        self.eventLogger.length(self.config["settings"]["max-history-length"])
+        if self.config["settings"].get("persistent-history"):
+            self.eventLogger.attach(EventJournal(self.runtime.path / "events.db"))
+
+        self.tts_cache = None
+        self.tts_wav_cache = None
+        self.tts_archive: typing.Optional[ClipArchive] = None
+        if self.config["audio"]["tts"]["enable-caching"]:
+            tts_config = self.config["audio"]["tts"]
+            budget = tts_config.get("cache-size-mb", 256) * 1024 * 1024
+            # wav files also stay bounded in archive mode, until they are moved into the archive on use
+            self.tts_cache = self.tts_wav_cache = self.runtime.cache_namespace("tts", budget)
+            if tts_config.get("cache-format") == "archive":
+                self.tts_archive = ClipArchive(
+                    self.runtime.mkdir_cache("tts-archive"), tts_config.get("cache-codec", "lz4")
+                )
+                self.tts_cache = self.runtime.cache_namespace("tts-archive", budget, remove=self.tts_archive.delete)
+        self.pcm_cache = PcmCache(self.config["audio"]["tts"].get("pcm-cache-mb", 16) * 1024 * 1024)
+        self.audio_output = AudioOutput()
+        self.speech = SpeechWorker()
+        self._chunk_path = Path(f"{PROJECT_DIR}/audio/tts/chunk.wav")
+        self.tts_warmup: typing.Optional[Warmup] = None
+
         self.__pre_init_callbacks__: list = []
         self.__post_init_callbacks__: list = []
 
@@ -245,18 +275,22 @@ class AppAPI:
 
         self.__actions__: dict = {}
 
-        self.scenarios: list = []
+        self.scenarios = ScenarioRegistry()
 
     def __no_command_default__(self, context, history):
         answer = random.choice(self.config[f"answers"]["default"])
         self.say(parse_config_answers(answer))
 
         self.eventLogger.record(self.Event(
-            "wake_word_used",
+            self.EventType.WAKE_WORD_USED,
             {"answer": answer}
         ))
 
-    def say(self, text: str, no_audio=False, prosody=94, speaker=None):
+    def say(self, text: str, no_audio=False, prosody=94, speaker=None, interrupt=False):
+        """
+        Speaks a phrase from the cache, or queues its synthesis on the speech worker.
+        `interrupt` drops the replies still waiting to be spoken, for a reply to a new request.
+        """
         if not text:
             return
 
@@ -264,32 +298,245 @@ class AppAPI:
             log.debug(f"No sound: {text}")
             return
 
-        def call_tts_in_thread(**kwargs):
-            process = threading.Thread(target=self.ttsi.say, kwargs=kwargs)
-            process.start()
+        if interrupt:
+            self.speech.cancel(self.speech.REPLY)
+            self.audio_output.clear()
+        # clips of a job still running when a later reply interrupts it are dropped by the output
+        generation = self.audio_output.generation
+
+        if self.tts_cache is not None:
+            if isinstance(text, Rendered) and not no_audio and self.config["audio"]["tts"].get("template-caching"):
+                self.speech.submit((text, prosody, speaker, "template"), lambda: self._synthesize_template(
+                    text, prosody, speaker, generation
+                ))
+                return
 
-        if self.config["audio"]["tts"]["enable-caching"]:
-            tts_cache: Path = self.runtime.mkdir_cache("tts")
-
-            normalized = text.strip().lower()
-            hash_input = str(f"{normalized}|prosody={prosody}|speaker={speaker or ''}")
-            phrase_hash = hashlib.sha256(hash_input.encode()).hexdigest()
-            filename = tts_cache / sanitize_filename(f"{phrase_hash}.wav")
-
-            cached_hash = self.runtime.read(f"tts:{hash_input}")
-            if cached_hash:
-                cached_file = tts_cache / f"{cached_hash}.wav"
-                if cached_file.exists():
-                    log.debug(f"Using cached tts file {cached_file} for text: {text}")
-                    self.runtime.write(f"tts:{hash_input}", cached_hash)  # Reinforce mapping
-                    playsound(str(cached_file), block=False)
-                    return
+            key, phrase_hash = self._tts_key(text, prosody, speaker)
+
+            clip = self._cached_clip(key)
+            if clip is not None:
+                log.debug(f"Using cached tts audio for text: {text}")
+                if not no_audio:
+                    self.audio_output.play(clip)
+                return
+
+            self.speech.submit((key, not no_audio), lambda: self._synthesize(
+                text, prosody, speaker, play=not no_audio, cache=(key, phrase_hash), generation=generation
+            ))
+        else:
+            self.speech.submit((text, prosody, speaker, not no_audio), lambda: self._synthesize(
+                text, prosody, speaker, play=not no_audio, generation=generation
+            ))
+
+    def _cached_clip(self, key: str) -> typing.Optional[Clip]:
+        """
+        The decoded audio of a cached phrase, from memory or from the tts cache
+        """
+        cached_hash = self.runtime.read(key)
+        if not cached_hash:
+            return None
+
+        clip = self.pcm_cache.get(cached_hash)
+        if clip is None:
+            clip = self._load_clip(cached_hash)
+            if clip is None:
+                return None
+            self.pcm_cache.put(cached_hash, clip)
+        self.tts_cache.touch(self._entry_name(cached_hash))
+        return clip
+
+    def _entry_name(self, phrase_hash: str) -> str:
+        return phrase_hash if self.tts_archive is not None else sanitize_filename(f"{phrase_hash}.wav")
 
-            call_tts_in_thread(text=text, path=str(filename), no_audio=no_audio, prosody=prosody, speaker=speaker)
-            self.runtime.write(f"tts:{hash_input}", phrase_hash)
+    def _load_clip(self, phrase_hash: str) -> typing.Optional[Clip]:
+        """
+        Reads a cached clip from the archive or from its wav file. Wav files left from before the archive
+        was enabled are moved into it on their first use.
+        """
+        if self.tts_archive is not None:
+            clip = self.tts_archive.get(phrase_hash)
+            if clip is not None:
+                return clip
+
+        cached_file = self.runtime.path / "tts" / f"{phrase_hash}.wav"
+        if not cached_file.exists():
+            return None
+        try:
+            clip = Clip.from_wav(cached_file)
+        except (wave.Error, EOFError) as e:
+            log.warning(f"Failed to decode cached tts file {cached_file}: {e}")
+            return None
+
+        if self.tts_archive is not None:
+            self.tts_archive.put(phrase_hash, clip)
+            self.tts_cache.add(phrase_hash, self.tts_archive.size(phrase_hash))
+            cached_file.unlink(missing_ok=True)
+            self.tts_wav_cache.discard(cached_file.name)
+        return clip
+
+    def _store_clip(self, key: str, phrase_hash: str, clip: Clip):
+        if self.tts_archive is not None:
+            self.tts_archive.put(phrase_hash, clip)
+            self.tts_cache.add(phrase_hash, self.tts_archive.size(phrase_hash))
+        else:
+            name = self._entry_name(phrase_hash)
+            clip.to_wav(self.tts_cache.path / name)
+            self.tts_cache.add(name)
+        self.runtime.write(key, phrase_hash)
+
+    def _synthesize_clip(self, text: str, prosody, speaker) -> Clip:
+        self.ttsi.say(text=text, path=str(self._chunk_path), no_audio=True, prosody=prosody, speaker=speaker)
+        return Clip.from_wav(self._chunk_path)
+
+    def _synthesize(self, text: str, prosody, speaker, play=True, cache=None, generation=None):
+        """
+        A speech worker job: synthesizes the phrase, stores it in the tts cache and plays it.
+        With streaming on, text of several sentences is synthesized sentence by sentence, each one playing
+        while the next is synthesized. Clips are queued under the output `generation` of the request, so a reply
+        interrupted while it was being synthesized is still cached but never played.
+        """
+        chunks = split_sentences(text) if play and self.config["audio"]["tts"].get("streaming") else [text]
+        if len(chunks) > 1:
+            clip = self._stream_chunks(chunks, prosody, speaker, generation)
+            if clip is None:
+                return
         else:
-            call_tts_in_thread(text=text, path=f"{PROJECT_DIR}/audio/tts/audio.wav", no_audio=no_audio,
-                               prosody=prosody, speaker=speaker)
+            clip = self._synthesize_clip(text, prosody, speaker)
+            if play:
+                self.audio_output.play(clip, generation)
+
+        if cache:
+            key, phrase_hash = cache
+            self._store_clip(key, phrase_hash, clip)
+            if play:
+                self.pcm_cache.put(phrase_hash, clip)
+
+    def _stream_chunks(self, chunks: typing.List[str], prosody, speaker, generation=None) -> typing.Optional[Clip]:
+        """
+        Synthesizes and queues the chunks one by one on the output stream, returns the whole phrase as one clip,
+        or None if the reply was cancelled on the way
+        """
+        job = self.speech.current
+        clips = []
+        for chunk in chunks:
+            if job is not None and job.cancelled:
+                return None
+            clips.append(self._synthesize_clip(chunk, prosody, speaker))
+            self.audio_output.play(clips[-1], generation)
+        return Clip.join(clips)
+
+    def _synthesize_template(self, text: Rendered, prosody, speaker, generation=None):
+        """
+        A speech worker job for translated templates: the template's fixed prose comes from the tts cache
+        (and is cached on a miss), only the slot values are synthesized, and the parts are spliced together
+        """
+        job = self.speech.current
+        clips = []
+        for segment, static in text.segments():
+            if job is not None and job.cancelled:
+                return
+            if not static:
+                clips.append(self._synthesize_clip(segment, prosody, speaker))
+                continue
+
+            key, phrase_hash = self._tts_key(segment, prosody, speaker)
+            clip = self._cached_clip(key)
+            if clip is None:
+                clip = self._synthesize_clip(segment, prosody, speaker)
+                self._store_clip(key, phrase_hash, clip)
+                self.pcm_cache.put(phrase_hash, clip)
+            clips.append(clip)
+
+        if clips:
+            self.audio_output.play(Clip.splice(clips), generation)
+
+    @staticmethod
+    def _tts_key(text: str, prosody=94, speaker=None) -> typing.Tuple[str, str]:
+        """
+        The runtime key of a phrase and the hash its cached audio file is named by
+        """
+        normalized = text.strip().lower()
+        hash_input = str(f"{normalized}|prosody={prosody}|speaker={speaker or ''}")
+        return f"tts:{hash_input}", hashlib.sha256(hash_input.encode()).hexdigest()
+
+    def is_cached(self, text: str, prosody=94, speaker=None) -> bool:
+        if self.tts_cache is None:
+            return False
+        cached_hash = self.runtime.read(self._tts_key(text, prosody, speaker)[0])
+        if not cached_hash:
+            return False
+        if self.pcm_cache.get(cached_hash) is not None:
+            return True
+        if self.tts_archive is not None and cached_hash in self.tts_archive:
+            return True
+        return (self.runtime.path / "tts" / f"{cached_hash}.wav").exists()
+
+    def cache_phrase(self, text: str, prosody=94, speaker=None) -> bool:
+        """
+        Synthesizes a phrase into the tts cache without playing it, in the background lane of the speech worker.
+        Returns False if it was cached already, a failed synthesis raises its exception
+        """
+        if self.tts_cache is None or self.is_cached(text, prosody, speaker):
+            return False
+
+        key, phrase_hash = self._tts_key(text, prosody, speaker)
+        return self.speech.submit((key, False), lambda: self._synthesize(
+            text, prosody, speaker, play=False, cache=(key, phrase_hash)
+        ), priority=self.speech.BACKGROUND).wait()
+
+    def static_phrases(self) -> typing.List[str]:
+        """
+        Every fixed phrase of the config answers, command responses and plugin locales.
+        Phrases with [placeholders] are left out, as well as single words, which are only ever spoken
+        as a part of a longer phrase. Of templates with {slots} only the fixed prose is kept, when template
+        caching is on.
+        """
+        phrases = []
+
+        def collect(value):
+            if isinstance(value, str):
+                phrases.append(value.strip())
+            elif isinstance(value, list):
+                for item in value:
+                    collect(item)
+            elif isinstance(value, dict):
+                for item in value.values():
+                    collect(item)
+
+        collect(self.config.get("answers"))
+        collect(self.config.get("start-up", {}).get("answers"))
+        for command in self.manager.commands:
+            collect(command.responses)
+        for locale in self.localeService.localisations.values():
+            collect(list(locale.translations.values()))
+
+        if self.config["audio"]["tts"].get("template-caching"):
+            for phrase in [phrase for phrase in phrases if "{" in phrase]:
+                try:
+                    segments = template_segments(phrase, defaultdict(str))
+                except (AttributeError, IndexError, KeyError, ValueError):
+                    continue
+                phrases.extend(text for text, static in segments if static)
+
+        dynamic = re.compile(r"\[.*?]|\{.*?}")
+        return list(dict.fromkeys(phrase for phrase in phrases if " " in phrase and not dynamic.search(phrase)))
+
+    def preload_tts(self) -> None:
+        """
+        Loads the tts model in the background, so the first uncached phrase is not delayed by it
+        """
+        if self.ttsi.active and not self.ttsi.loaded:
+            self.ttsi.load_async()
+
+    def warm_up_tts(self) -> typing.Optional[Warmup]:
+        """
+        Starts pre-synthesizing the static phrases into the tts cache in the background
+        """
+        if self.tts_cache is None or not self.ttsi.active:
+            return None
+        self.tts_warmup = Warmup(self.static_phrases(), self.cache_phrase)
+        self.tts_warmup.start()
+        return self.tts_warmup
 
     @staticmethod
     def __blank__(context, history):
@@ -319,9 +566,29 @@ class AppAPI:
 
     # < ------------------- Modules ------------------- >
     def add_func_for_search(self, *args):
-        log.info(f"Added functions to actions: {args}")
+        added = []
         for func in args:
-            self.__actions__.update({func.__name__: func})
+            try:
+                self.__actions__[func.__name__] = action_invoker(func)
+            except (TypeError, ValueError) as e:
+                log.warning(f"Function {func.__name__} can not be used as an action: {e}")
+                continue
+            added.append(func.__name__)
+        log.info(f"Added functions to actions: {added}")
+
+    def _add_actions(self, functions: dict) -> list:
+        """
+        Registers the functions of a module that can be called as actions, skipping helpers with other signatures
+        """
+        added = []
+        for name, func in functions.items():
+            try:
+                self.__actions__[name] = action_invoker(func)
+            except (TypeError, ValueError):
+                log.debug(f"Skipped {name}: its signature does not fit an action")
+                continue
+            added.append(name)
+        return added
 
     def add_module_for_search(self, path: str = None, module=None, include_private: bool = False):
         """
@@ -351,11 +618,9 @@ class AppAPI:
             }
             if not include_private:
                 filtered_dict = {k: v for k, v in functions.items() if not k.startswith('__')}
-                self.__actions__.update(filtered_dict)
-                log.info(f"Added functions to actions: {list(filtered_dict.keys())}")
+                log.info(f"Added functions to actions: {self._add_actions(filtered_dict)}")
             else:
-                self.__actions__.update(functions)
-                log.info(f"Added functions to actions: {list(functions.keys())}")
+                log.info(f"Added functions to actions: {self._add_actions(functions)}")
         else:
             log.warning(f"module: {module} is not a module object, try again")
             return
@@ -383,11 +648,17 @@ class AppAPI:
 
     def set_no_command_callback(self, func: types.FunctionType):
         """A function that will run if no command was recognized"""
-        self.__no_command_callback__ = func
+        try:
+            self.__no_command_callback__ = action_invoker(func)
+        except (TypeError, ValueError) as e:
+            log.warning(f"Function {func.__name__} can not be used as a no command callback: {e}")
 
     def set_trigger_callback(self, func: types.FunctionType):
         """A function that will run when a command was recognized"""
-        self.__trigger_callback__ = func
+        try:
+            self.__trigger_callback__ = action_invoker(func)
+        except (TypeError, ValueError) as e:
+            log.warning(f"Function {func.__name__} can not be used as a trigger callback: {e}")
 
     def endpoint(self, func: types.FunctionType):
         self.__setattr__(func.__name__, func)
@@ -527,17 +798,10 @@ class AppAPI:
 
     # <! --------------- scenarios --------------- !>
     def add_scenario(self, scenario):
-        for el in self.scenarios[:]:
-            if el.name == scenario.name:
-                self.scenarios.insert(self.scenarios.index(el), scenario)
-                self.scenarios.remove(el)
-                return
-        self.scenarios.append(scenario)
+        self.scenarios.add(scenario)
 
     def remove_scenario(self, name):
-        for el in self.scenarios[:]:
-            if el.name == name:
-                self.scenarios.remove(el)
+        self.scenarios.remove(name)
 
 
 app = AppAPI()
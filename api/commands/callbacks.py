@@ -0,0 +1,61 @@
+import inspect
+import functools
+
+from typing import Any, Callable
+
+ACTION_KWARGS = ("command", "context", "history")
+
+
+def request_invoker(callback: Callable) -> Callable[[str], Any]:
+    """
+    Inspects a trigger callback once and returns a function that calls it with the user request
+    the way its signature expects: positionally, as request=..., or without arguments.
+    Raises TypeError for callbacks that can not receive the request at all.
+    """
+    params = inspect.signature(callback).parameters.values()
+
+    positional = [p for p in params if p.kind in (inspect.Parameter.POSITIONAL_ONLY,
+                                                  inspect.Parameter.POSITIONAL_OR_KEYWORD)]
+    var_positional = any(p.kind == inspect.Parameter.VAR_POSITIONAL for p in params)
+    var_keyword = any(p.kind == inspect.Parameter.VAR_KEYWORD for p in params)
+    keyword_only = {p.name: p for p in params if p.kind == inspect.Parameter.KEYWORD_ONLY}
+    required_keyword = [name for name, p in keyword_only.items() if p.default is inspect.Parameter.empty]
+
+    if positional or var_positional:
+        if required_keyword or [p for p in positional[1:] if p.default is inspect.Parameter.empty]:
+            raise TypeError(f"Trigger callback {callback.__name__} requires more than the request argument")
+        return callback
+    if var_keyword or "request" in keyword_only:
+        if [name for name in required_keyword if name != "request"]:
+            raise TypeError(f"Trigger callback {callback.__name__} requires more than the request argument")
+        return lambda request: callback(request=request)
+    if required_keyword:
+        raise TypeError(f"Trigger callback {callback.__name__} can not receive the request")
+    return lambda request: callback()
+
+
+def action_invoker(action: Callable) -> Callable[..., Any]:
+    """
+    Inspects an action once and returns a function taking command, context and history as keywords
+    that passes on only the ones the action declares.
+    Raises TypeError for actions that require any other argument.
+    """
+    params = inspect.signature(action).parameters.values()
+
+    if any(p.kind == inspect.Parameter.VAR_KEYWORD for p in params):
+        return action
+
+    required = [p.name for p in params if p.default is inspect.Parameter.empty
+                and p.kind not in (inspect.Parameter.VAR_POSITIONAL, inspect.Parameter.VAR_KEYWORD)]
+    unknown = [name for name in required if name not in ACTION_KWARGS]
+    if unknown or any(p.kind == inspect.Parameter.POSITIONAL_ONLY and p.name in required for p in params):
+        raise TypeError(f"Action {action.__name__} requires arguments an action is not called with: {unknown}")
+
+    accepted = tuple(p.name for p in params if p.name in ACTION_KWARGS
+                     and p.kind != inspect.Parameter.POSITIONAL_ONLY)
+
+    @functools.wraps(action)
+    def invoke(**kwargs):
+        return action(**{name: kwargs[name] for name in accepted if name in kwargs})
+
+    return invoke
@@ -0,0 +1,95 @@
+from typing import Dict, Iterable, List, Optional, Set
+
+
+class FuzzyIndex:
+    """
+    SymSpell-style deletion index over a vocabulary.
+    Every word is stored under all the strings obtained by deleting up to `max_distance` characters from it,
+    so a lookup only generates the deletions of the query and verifies the few candidates it shares them with.
+    """
+    def __init__(self, words: Iterable[str] = (), max_distance: int = 2, min_length: int = 4):
+        self.max_distance = max_distance
+        self.min_length = min_length
+
+        self.words: Set[str] = set()
+        self._deletes: Dict[str, Set[str]] = {}
+
+        for word in words:
+            self.add(word)
+
+    def add(self, word: str):
+        if word in self.words:
+            return
+        self.words.add(word)
+        for variant in self._variants(word, self.max_distance):
+            self._deletes.setdefault(variant, set()).add(word)
+
+    def allowed_distance(self, word: str) -> int:
+        """
+        Short words are too ambiguous to correct, long ones may take up to max_distance edits
+        """
+        if len(word) < self.min_length:
+            return 0
+        if len(word) < self.min_length * 2:
+            return min(1, self.max_distance)
+        return self.max_distance
+
+    def lookup(self, word: str) -> Optional[str]:
+        """
+        Returns the closest known word within the allowed distance, or None
+        """
+        if word in self.words:
+            return word
+
+        distance = self.allowed_distance(word)
+        if not distance:
+            return None
+
+        candidates = set()
+        for variant in self._variants(word, distance):
+            candidates.update(self._deletes.get(variant, ()))
+
+        best, best_distance = None, distance + 1
+        for candidate in sorted(candidates):
+            if abs(len(candidate) - len(word)) > distance:
+                continue
+            current = edit_distance(word, candidate, best_distance)
+            if current < best_distance:
+                best, best_distance = candidate, current
+        return best
+
+    def correct(self, words: List[str]) -> List[str]:
+        """
+        Replaces unknown words with their closest known word, leaving the rest untouched
+        """
+        return [self.lookup(word) or word for word in words]
+
+    @staticmethod
+    def _variants(word: str, distance: int) -> Set[str]:
+        variants = {word}
+        frontier = {word}
+        for _ in range(distance):
+            frontier = {item[:i] + item[i + 1:] for item in frontier for i in range(len(item))}
+            variants |= frontier
+        return variants
+
+
+def edit_distance(first: str, second: str, limit: int) -> int:
+    """
+    Optimal string alignment distance (Damerau-Levenshtein with adjacent transpositions).
+    Stops early and returns `limit` once every alignment is at least that far.
+    """
+    previous_previous = None
+    previous = list(range(len(second) + 1))
+    for i in range(1, len(first) + 1):
+        current = [i] + [0] * len(second)
+        for j in range(1, len(second) + 1):
+            cost = first[i - 1] != second[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (previous_previous is not None and i > 1 and j > 1
+                    and first[i - 1] == second[j - 2] and first[i - 2] == second[j - 1]):
+                current[j] = min(current[j], previous_previous[j - 2] + 1)
+        if min(current) >= limit and min(previous) + 1 >= limit:
+            return limit
+        previous_previous, previous = previous, current
+    return min(previous[-1], limit)
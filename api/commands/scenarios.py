@@ -1,7 +1,17 @@
-import re
-import inspect
+import string
+import itertools
 
-from typing import List, Callable, Union, Optional, Dict
+from typing import List, Callable, Union, Optional, Dict, Tuple, FrozenSet
+
+from .tree import VOCABULARY
+from .callbacks import request_invoker
+
+
+def request_ids(request: str) -> List[int]:
+    """
+    Splits a request into interned word ids, words no trigger or command uses become VOCABULARY.UNKNOWN
+    """
+    return [VOCABULARY.lookup(word.strip(string.punctuation)) for word in request.lower().split()]
 
 
 class Trigger:
@@ -17,63 +27,58 @@ class Trigger:
         self.keywords = keywords
         self.synonyms = synonyms if synonyms is not None else {}
         self.equivalents = equivalents if equivalents is not None else []
-        self.callback = self.blank if callback is None else callback
-        self.keyword_combinations = self._generate_keyword_combinations()
+        self.callback = callback
+        self.sequences = self._compile()
 
-    def blank(self, request):
-        pass
+    @property
+    def callback(self) -> Callable:
+        return self._callback
 
-    def _generate_keyword_combinations(self) -> List[List[str]]:
+    @callback.setter
+    def callback(self, callback: Callable):
         """
-        Generates all possible keyword combinations a trigger could react to
+        Inspects the callback once, so that firing the trigger does not have to
         """
-        def generate_combinations(current_keywords: List[str], keyword_index: int) -> List[List[str]]:
-            if keyword_index >= len(current_keywords):
-                return [current_keywords.copy()]
-
-            combinations = []
-            current_word = current_keywords[keyword_index]
-            words_to_try = [current_word]
-
-            if current_word in self.synonyms:
-                words_to_try.extend(self.synonyms[current_word])
-
-            for word in words_to_try:
-                current_keywords[keyword_index] = word
-                combinations.extend(generate_combinations(current_keywords, keyword_index + 1))
-
-            current_keywords[keyword_index] = current_word
-            return combinations
+        self._callback = self.blank if callback is None else callback
+        self.invoke = request_invoker(self._callback)
 
-        base_combinations = generate_combinations(self.keywords.copy(), 0)
-        all_combinations = base_combinations.copy()
-        for equivalent in self.equivalents:
-            all_combinations.extend(generate_combinations(equivalent.copy(), 0))
-
-        return all_combinations
+    def blank(self, request):
+        pass
 
-    def match(self, request: str) -> bool:
+    def _compile(self) -> List[Tuple[FrozenSet[int], ...]]:
         """
-        Checks whether the trigger keywords match the user request
+        Compiles the keywords and every equivalent into sequences of accepted word ids, with synonyms folded in
         """
-        request_lower = request.lower()
-
-        for keyword_set in self.keyword_combinations:
-            if self._match_keywords(request_lower, keyword_set):
-                return True
-
-        return False
+        sequences = []
+        for keywords in [self.keywords, *self.equivalents]:
+            if keywords:
+                sequences.append(tuple(
+                    frozenset(VOCABULARY.intern(form.lower()) for form in [keyword, *(self.synonyms.get(keyword) or [])])
+                    for keyword in keywords
+                ))
+        return sequences
+
+    @property
+    def first_ids(self) -> FrozenSet[int]:
+        """
+        Word ids that can start the trigger, a request without any of them can not match it
+        """
+        return frozenset().union(*(sequence[0] for sequence in self.sequences))
 
-    @staticmethod
-    def _match_keywords(request_lower: str, keywords: List[str]) -> bool:
+    def match(self, request: str) -> bool:
         """
-        Checks matches of all the possible keyword combinations with a request
+        Checks whether the trigger keywords (or one of the equivalents) appear in the user request in order.
+        All the sequences advance together in a single pass over the request words.
         """
-        pattern = r'\b({0})\b'.format('|'.join(re.escape(kw) for kw in keywords))
-        matches = re.findall(pattern, request_lower)
-        if len(matches) == len(keywords):
-            keyword_indices = [request_lower.index(match) for match in matches]
-            return all(keyword_indices[i] < keyword_indices[i + 1] for i in range(len(keyword_indices) - 1))
+        progress = [0] * len(self.sequences)
+        for word_id in request_ids(request):
+            if word_id == VOCABULARY.UNKNOWN:
+                continue
+            for index, sequence in enumerate(self.sequences):
+                if word_id in sequence[progress[index]]:
+                    progress[index] += 1
+                    if progress[index] == len(sequence):
+                        return True
         return False
 
 
@@ -120,72 +125,182 @@ class Scenario:
         self.active = False
         self.request_since_last_trigger = 0
 
-    @staticmethod
-    def _call_callback(callback, request):
+        self.state = 0
+        self._transitions: Optional[List[List[Tuple[Trigger, int, bool]]]] = None
+        self._complete: List[bool] = []
+        self._steps: List[int] = []
+
+    def compile(self):
         """
-        Checks what arguments does the active trigger callback accept
+        Flattens the timeline, nested timelines included, into numbered states.
+        A state is the step of the timeline together with the progress of every nested timeline of that step,
+        its transition table lists (trigger, next state, direct) in the order the triggers are checked.
+        Direct transitions belong to the step itself, the others advance a nested timeline.
         """
-        sig = inspect.signature(callback)
-        params = sig.parameters
-
-        accepts_positional = False
-        accepts_kwargs = False
-        no_params = len(params) == 0
+        def nested(timeline: Timeline, step: int) -> List[Timeline]:
+            if step >= len(timeline.timeline_structure):
+                return []
+            return [item for item in timeline.timeline_structure[step] if isinstance(item, Timeline)]
+
+        def initial(timeline: Timeline, step: int = 0) -> tuple:
+            return step, tuple(initial(child) for child in nested(timeline, step))
+
+        def moves(timeline: Timeline, configuration: tuple) -> List[Tuple[Trigger, tuple, bool]]:
+            step, children = configuration
+            if step >= len(timeline.timeline_structure):
+                return []
+            result = []
+            child_index = 0
+            for item in timeline.timeline_structure[step]:
+                if isinstance(item, Trigger):
+                    result.append((item, initial(timeline, step + 1), True))
+                elif isinstance(item, Timeline):
+                    for trigger, child, _ in moves(item, children[child_index]):
+                        result.append((trigger, (step, children[:child_index] + (child,) + children[child_index + 1:]),
+                                       False))
+                    child_index += 1
+            return result
+
+        states = {initial(self.timeline): 0}
+        queue = [initial(self.timeline)]
+        transitions, complete, steps = [], [], []
+        for configuration in queue:
+            table = []
+            for trigger, target, direct in moves(self.timeline, configuration):
+                if target not in states:
+                    states[target] = len(queue)
+                    queue.append(target)
+                table.append((trigger, states[target], direct))
+            transitions.append(table)
+            complete.append(configuration[0] >= len(self.timeline.timeline_structure))
+            steps.append(configuration[0])
+
+        self._transitions, self._complete, self._steps = transitions, complete, steps
+        self._set_state(0)
+
+    def _set_state(self, state: int):
+        self.state = state
+        self.timeline.current_group_index = self._steps[state]
+        self.timeline.current_trigger_index = 0
 
-        for p in params.values():
-            if p.kind in (inspect.Parameter.POSITIONAL_ONLY, inspect.Parameter.POSITIONAL_OR_KEYWORD):
-                accepts_positional = True
-            if p.kind == inspect.Parameter.VAR_KEYWORD:
-                accepts_kwargs = True
+    def reset(self):
+        self.active = False
+        self._set_state(0)
 
-        if accepts_positional:
-            callback(request)
-        elif accepts_kwargs:
-            callback(request=request)
-        elif no_params:
-            callback()
-        else:
-            callback(request)
+    def start_ids(self) -> FrozenSet[int]:
+        """
+        Word ids that can start the triggers of the current timeline step
+        """
+        if self._transitions is None:
+            self.compile()
+        return frozenset().union(*(trigger.first_ids for trigger, _, direct in self._transitions[self.state] if direct))
 
-    def check_scenario(self, request: str, request_history) -> bool:
+    def check_scenario(self, request: str, request_history=None) -> bool:
         """
         Checks whether the user request activates the scenario
         """
-        request_history = [event.details.get("request") for event in request_history]
+        if self._transitions is None:
+            self.compile()
+
         if not self.active:
-            start_triggers = self.timeline.get_current_triggers()
-            for trigger in start_triggers:
-                if isinstance(trigger, Trigger) and trigger.match(request):
+            for trigger, target, direct in self._transitions[self.state]:
+                if direct and trigger.match(request):
                     self.active = True
                     self.request_since_last_trigger = 0
-                    if trigger.callback:
-                        self._call_callback(trigger.callback, request)
-                    self.timeline.advance()
+                    trigger.invoke(request)
+                    self._set_state(target)
                     return True
             return False
 
-        if self.timeline.is_complete():
-            self.active = False
-            self.timeline.reset()
+        if self._complete[self.state]:
+            self.reset()
             return False
 
-        current_triggers = self.timeline.get_current_triggers()
         self.request_since_last_trigger += 1
 
         if self.request_since_last_trigger > self.max_gap:
-            self.active = False
-            self.timeline.reset()
+            self.reset()
             return False
 
-        for trigger in current_triggers:
-            if isinstance(trigger, Trigger) and trigger.match(request):
-                self.request_since_last_trigger = 0
-                if trigger.callback:
-                    self._call_callback(trigger.callback, request)
-                self.timeline.advance()
+        for trigger, target, direct in self._transitions[self.state]:
+            if trigger.match(request):
+                if direct:
+                    self.request_since_last_trigger = 0
+                trigger.invoke(request)
+                self._set_state(target)
                 return True
-            elif isinstance(trigger, Timeline):
-                sub_scenario = Scenario("sub", trigger, self.max_gap)
-                if sub_scenario.check_scenario(request, request_history):
-                    return True
         return True
+
+
+class ScenarioRegistry:
+    """
+    Keeps scenarios in registration order and only checks the ones a request can affect:
+    active scenarios, and inactive ones whose current step has a trigger starting with one of the request words.
+    """
+    def __init__(self):
+        self._scenarios: Dict[str, Scenario] = {}
+        self._positions: Dict[str, int] = {}
+        self._order = itertools.count()
+        self._active: Dict[str, Scenario] = {}
+        self._index: Dict[int, Dict[str, Scenario]] = {}  # word id -> inactive scenarios that can start with it
+        self._indexed: Dict[str, FrozenSet[int]] = {}
+
+    def __iter__(self):
+        return iter(list(self._scenarios.values()))
+
+    def __len__(self):
+        return len(self._scenarios)
+
+    def add(self, scenario: Scenario):
+        """
+        Adds a scenario, one with the same name is replaced in place
+        """
+        scenario.compile()
+        if scenario.name not in self._positions:
+            self._positions[scenario.name] = next(self._order)
+        self._scenarios[scenario.name] = scenario
+        self._track(scenario)
+
+    def remove(self, name: str):
+        if self._scenarios.pop(name, None) is not None:
+            del self._positions[name]  # added again, it goes to the end
+            self._untrack(name)
+
+    def check(self, request: str) -> List[Scenario]:
+        """
+        Runs check_scenario on the candidate scenarios, returns the ones that reacted to the request
+        """
+        candidates = dict(self._active)
+        for word_id in set(request_ids(request)):
+            candidates.update(self._index.get(word_id, {}))
+
+        updated = []
+        for name in sorted(candidates, key=self._positions.__getitem__):
+            scenario = candidates[name]
+            if scenario.check_scenario(request):
+                updated.append(scenario)
+            if self._scenarios.get(name) is scenario:
+                self._track(scenario)
+        return updated
+
+    def _track(self, scenario: Scenario):
+        """
+        Files a scenario under the active set or the index of its current step after its state changed
+        """
+        self._untrack(scenario.name)
+        if scenario.active:
+            self._active[scenario.name] = scenario
+            return
+
+        word_ids = scenario.start_ids()
+        self._indexed[scenario.name] = word_ids
+        for word_id in word_ids:
+            self._index.setdefault(word_id, {})[scenario.name] = scenario
+
+    def _untrack(self, name: str):
+        self._active.pop(name, None)
+        for word_id in self._indexed.pop(name, ()):
+            indexed = self._index[word_id]
+            del indexed[name]
+            if not indexed:
+                del self._index[word_id]
@@ -1,12 +1,51 @@
 import datetime
-from typing import List, Dict, Optional, Any
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Optional, Any, Tuple, FrozenSet, Iterable
+
+from .fuzzy import FuzzyIndex
+
+
+class Vocabulary:
+    """
+    Interns every word used by commands to an integer id shared by all Command objects.
+    Words that were never interned are looked up as UNKNOWN, which no command accepts.
+    """
+    UNKNOWN = -1
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._words: List[str] = []
+
+    def intern(self, word: str) -> int:
+        word_id = self._ids.get(word)
+        if word_id is None:
+            word_id = self._ids[word] = len(self._words)
+            self._words.append(word)
+        return word_id
+
+    def lookup(self, word: str) -> int:
+        return self._ids.get(word, self.UNKNOWN)
+
+    def word(self, word_id: int) -> str:
+        return self._words[word_id]
+
+    def __len__(self):
+        return len(self._words)
+
+
+VOCABULARY = Vocabulary()
 
 
 class Command:
     def __init__(self, keywords: List[str], action: str, synonyms: Dict[str, List[str]] = None, responses: List = None,
-                 parameters: Dict = None, continues: bool = False, equivalents: List = None, tts: bool = False):
+                 parameters: Dict = None, continues: bool = False, equivalents: List = None, tts: bool = False,
+                 early: bool = False):
         if synonyms is None:
             synonyms = {}
+        synonyms = {key: [value] if isinstance(value, str) else value for key, value in synonyms.items()}
         if parameters is None:
             parameters = {}
         if responses is None:
@@ -22,32 +61,365 @@ class Command:
         self.continues = continues
         self.equivalents = equivalents
         self.tts = tts
+        self.early = early  # the action ignores the words after the keywords, so it may run from a partial result
+
+        self._index_words()
+
+    def _index_words(self):
+        """
+        Precomputes the interned word ids the matcher compares against:
+        accepts - ids accepted at every keyword position,
+        vocabulary - ids of all keywords and synonyms,
+        canonical - synonym id -> the keyword it stands for
+        """
+        self.accepts: Tuple[FrozenSet[int], ...] = tuple(
+            frozenset(VOCABULARY.intern(form) for form in self.forms(keyword)) for keyword in self.keywords
+        )
+
+        canonical: Dict[int, str] = {}
+        for keyword, synonyms in self.synonyms.items():
+            for synonym in synonyms or []:
+                canonical.setdefault(VOCABULARY.intern(synonym), keyword)
+        self.canonical = canonical
+
+        self.vocabulary: FrozenSet[int] = frozenset(
+            [*(VOCABULARY.intern(keyword) for keyword in self.keywords), *canonical]
+        )
 
     def copy(self, keywords):
         return Command(keywords, self.action, self.synonyms, self.responses, self.parameters, self.continues,
-                       tts=self.tts)
+                       tts=self.tts, early=self.early)
+
+    def forms(self, keyword: str) -> List[str]:
+        """
+        Returns every surface word that is accepted in place of a keyword
+        """
+        forms = [keyword]
+        for synonym in self.synonyms.get(keyword) or []:
+            if synonym not in forms:
+                forms.append(synonym)
+        return forms
+
+
+class TrieNode:
+    __slots__ = ("children", "commands", "_ranked")
+
+    def __init__(self):
+        self.children: Dict[str, "TrieNode"] = {}
+        self.commands: Dict[Command, None] = {}  # insertion-ordered set
+        self._ranked: Optional[List[Command]] = None
+
+    @property
+    def ranked(self) -> List[Command]:
+        """
+        Commands of the node ordered from the longest keyword list to the shortest
+        """
+        if self._ranked is None:
+            self._ranked = sorted(self.commands, key=lambda cmd: len(cmd.keywords), reverse=True)
+        return self._ranked
+
+
+EMPTY_NODE = TrieNode()
+
+
+class CommandTrie:
+    """
+    Keyword trie with synonyms folded into its edges.
+    A node reached by a sequence of words holds every command whose keyword prefix accepts that sequence,
+    in registration order.
+    """
+    def __init__(self):
+        self.root = TrieNode()
+        self._edges: Dict[Command, List[tuple]] = {}
+
+    def insert(self, command: Command):
+        edges = []
+        self.root.commands[command] = None
+        self.root._ranked = None
+
+        frontier = [self.root]
+        for keyword in command.keywords:
+            next_frontier = []
+            for node in frontier:
+                for form in command.forms(keyword):
+                    child = node.children.get(form)
+                    if child is None:
+                        child = node.children[form] = TrieNode()
+                    child.commands[command] = None
+                    child._ranked = None
+                    edges.append((node, form, child))
+                    next_frontier.append(child)
+            frontier = next_frontier
+
+        self._edges[command] = edges
+
+    def remove(self, command: Command):
+        del self.root.commands[command]
+        self.root._ranked = None
+
+        for parent, form, child in reversed(self._edges.pop(command)):
+            del child.commands[command]
+            child._ranked = None
+            if not child.commands:
+                del parent.children[form]
+
+    def walk(self, words: List[str]) -> Optional[TrieNode]:
+        node = self.root
+        for word in words:
+            node = node.children.get(word)
+            if node is None:
+                return None
+        return node
+
+    def words(self) -> set:
+        """
+        Every surface word the trie accepts at any position
+        """
+        words = set()
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            words.update(node.children)
+            stack.extend(node.children.values())
+        return words
+
+    def size(self) -> int:
+        count = 0
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            count += 1
+            stack.extend(node.children.values())
+        return count
+
+
+class RequestCache:
+    """
+    Bounded LRU cache of normalized request -> Manager.find result
+    """
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(request: str) -> str:
+        return " ".join(request.lower().split())
+
+    def get(self, key: str):
+        with self._lock:
+            result = self._entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key: str, result):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class PartialMatcher:
+    """
+    Commits a command from partial speech recognition results before the utterance is finalized.
+    A request is committed only when it stays the same for `stability` partial results and spells out exactly one
+    `early` command that no longer command can extend. The final result then either confirms or cancels the commit.
+    """
+    def __init__(self, manager: "Manager", stability: int = 2):
+        self.manager = manager
+        self.stability = stability
+
+        self.committed: Optional[list] = None
+        self._committed_request: Optional[str] = None
+        self._last = None
+        self._seen = 0
+
+    def feed(self, request: str) -> Optional[list]:
+        """
+        Takes the partial request recognized so far, returns the find result if the command should run now
+        """
+        key = RequestCache.normalize(request)
+        if not key:
+            self.reset()  # a new utterance started, the previous one never got a final result
+            return None
+        if self.committed is not None:
+            return None
+
+        self._seen = self._seen + 1 if key == self._last else 1
+        self._last = key
+        if self._seen < self.stability:
+            return None
+
+        words = key.split()
+        node = self.manager.trie.walk(words)
+        if node is None or node.children:
+            return None
+        complete = [command for command in node.commands if len(command.keywords) == len(words)]
+        if len(complete) != 1 or complete[0].continues or not complete[0].early:
+            return None
+
+        result = self.manager.find(key)  # partials are one-off requests, kept out of the request cache
+        if len(result) != 1 or result[0][0] is not complete[0] or result[0][1]:
+            return None
+
+        self.committed = result
+        self._committed_request = key
+        return result
+
+    def resolve(self, request: Optional[str]) -> bool:
+        """
+        Takes the final request of the utterance, returns whether it confirms the committed command.
+        A final request that only adds words after the committed one confirms it too: the command already ran,
+        and its action ignores those words.
+        """
+        committed, committed_request = self.committed, self._committed_request
+        self.reset()
+        if committed is None or request is None:
+            return False
+
+        key = RequestCache.normalize(request)
+        if key == committed_request or key.startswith(committed_request + " "):
+            return True
+        result = self.manager.find(key)
+        return [tuple(item) for item in result] == [tuple(item) for item in committed]
+
+    def reset(self):
+        self.committed = None
+        self._committed_request = None
+        self._last = None
+        self._seen = 0
+
+
+_pool_manager: Optional["Manager"] = None
+_pool_positions: Dict[Command, int] = {}
+
+
+def _pool_init(manager: "Manager"):
+    global _pool_manager, _pool_positions
+    _pool_manager = manager
+    _pool_positions = {command: position for position, command in enumerate(manager.commands)}
+
+
+def _pool_find(requests: List[str]) -> List[List[Tuple[int, str]]]:
+    """
+    Runs in a worker process, commands are returned as positions since the objects can not cross processes as is
+    """
+    return [[(_pool_positions[command], context) for command, context in _pool_manager.find(request)]
+            for request in requests]
 
 
 class Manager:
     def __init__(self):
         self.Command = Command
-        self.commands = []
+        self.trie = CommandTrie()
+        self.cache = RequestCache()
+
+        self.fuzzy_distance = 0  # 0 disables fuzzy matching
+        self._fuzzy: Optional[FuzzyIndex] = None
+        self._words: Optional[FrozenSet[str]] = None
+
+        self._index: Dict[Tuple[str, ...], List[Command]] = {}  # keywords -> commands registered with them
+        self._equivalents: Dict[Command, List[Command]] = {}  # primary command -> copies made for its equivalents
+        self._primaries: Dict[Command, Command] = {}  # equivalent copy -> primary command
+
+    @property
+    def commands(self) -> List[Command]:
+        """
+        Every registered command, equivalents included, in registration order
+        """
+        return list(self.trie.root.commands)
 
     def add(self, *commands: Command):
         """
         Add one or more Command instances to the manager.
+        A command replaces the ones registered with the same keywords, together with their equivalents.
         """
         for command in commands:
             if isinstance(command, Command):
-                for cmd in self.commands[:]:
-                    if cmd.keywords == command.keywords:
-                        self.commands.remove(cmd)
-                self.commands.append(command)
+                for cmd in self._index.pop(tuple(command.keywords), []):
+                    self._remove(cmd)
+
+                self._register(command)
+                copies = self._equivalents[command] = []
                 for equivalent in command.equivalents:
-                    self.commands.append(command.copy(equivalent))
+                    copy = command.copy(equivalent)
+                    self._register(copy)
+                    self._primaries[copy] = command
+                    copies.append(copy)
             else:
                 raise TypeError(f"Expected Command instance, got {type(command).__name__}")
 
+        self.cache.clear()
+        self._fuzzy = None
+        self._words = None
+
+    def enable_fuzzy(self, max_distance: int = 2):
+        """
+        Lets find_cached retry requests that matched nothing with misrecognized words corrected to command words
+        """
+        self.fuzzy_distance = max_distance
+        self._fuzzy = None
+        self.cache.clear()
+
+    @property
+    def fuzzy(self) -> Optional[FuzzyIndex]:
+        """
+        Deletion index over the current command words, rebuilt lazily after the command set changes
+        """
+        if self.fuzzy_distance and self._fuzzy is None:
+            self._fuzzy = FuzzyIndex(self.trie.words(), self.fuzzy_distance)
+        return self._fuzzy
+
+    @property
+    def words(self) -> FrozenSet[str]:
+        """
+        Every command word, rebuilt lazily after the command set changes
+        """
+        if self._words is None:
+            self._words = frozenset(self.trie.words())
+        return self._words
+
+    def partial_matcher(self, stability: int = 2) -> PartialMatcher:
+        return PartialMatcher(self, stability)
+
+    def _register(self, command: Command):
+        self._index.setdefault(tuple(command.keywords), []).append(command)
+        self.trie.insert(command)
+
+    def _remove(self, command: Command):
+        if command not in self.trie.root.commands:
+            return
+        self.trie.remove(command)
+
+        primary = self._primaries.pop(command, None)
+        if primary is not None:
+            self._equivalents[primary].remove(command)
+
+        for copy in self._equivalents.pop(command, []):
+            del self._primaries[copy]
+            siblings = self._index.get(tuple(copy.keywords), [])
+            if copy in siblings:
+                siblings.remove(copy)
+                if not siblings:
+                    del self._index[tuple(copy.keywords)]
+            self.trie.remove(copy)
+
     def construct_recognizer_string(self):
         words = []
         for command in self.commands:
@@ -56,19 +428,54 @@ class Manager:
                 words.extend(synonyms)
         return " ".join(set(words))
 
+    def find_cached(self, request: str):
+        """
+        Same as find, but answers repeated requests from the LRU cache.
+        The cache is cleared every time the command set changes.
+        With fuzzy matching enabled, a request that matched nothing is retried with corrected words.
+        """
+        key = self.cache.normalize(request)
+        result = self.cache.get(key)
+        if result is None:
+            result = self.find(key)
+            if not result and self.fuzzy is not None:
+                corrected = " ".join(self.fuzzy.correct(key.split()))
+                if corrected != key:
+                    result = self.find(corrected)
+            self.cache.put(key, result)
+        return [list(item) for item in result]
+
+    def find_many(self, requests: Iterable[str], processes: int = 0, chunksize: int = 512) -> List[list]:
+        """
+        Runs find over many requests and returns the results in the same order.
+        Identical requests are matched once. With processes > 1 the unique requests are split between forked worker
+        processes sharing the already built index.
+        """
+        keys = [RequestCache.normalize(request) for request in requests]
+        unique = list(dict.fromkeys(keys))
+
+        if processes > 1 and len(unique) > chunksize and "fork" in multiprocessing.get_all_start_methods():
+            commands = self.commands
+            chunks = [unique[i:i + chunksize] for i in range(0, len(unique), chunksize)]
+            context = multiprocessing.get_context("fork")
+            with ProcessPoolExecutor(processes, mp_context=context, initializer=_pool_init,
+                                     initargs=(self,)) as pool:
+                found = [[[commands[position], text] for position, text in result]
+                         for chunk in pool.map(_pool_find, chunks) for result in chunk]
+            results = dict(zip(unique, found))
+        else:
+            results = {key: self.find(key) for key in unique}
+
+        return [[list(item) for item in results[key]] for key in keys]
+
     def find(self, request: str):
         request = request.lower().strip()
         words = request.split()
+        ids = [VOCABULARY.lookup(word) for word in words]
 
         results = {}
 
-        first_keywords = {}
-        for command in self.commands:
-            first_keywords[command.keywords[0]] = command
-            for synonym in command.synonyms.get(command.keywords[0], []):
-                first_keywords[synonym] = command
-
-        mapping = self.map_words_to_indexes(words, first_keywords)
+        mapping = self.map_words_to_indexes(words, self.trie.root.children)
         found_command = len(words)
         previous_index = None
 
@@ -78,54 +485,41 @@ class Manager:
                     results = {previous_index: results.get(previous_index)}
 
             previous_index = index
-            constructed = [keyword]
-
-            matches = self.get_matching_commands(constructed)
+            # every command of a node accepts the words that lead to it, so no further prefix checks are needed
+            node = self.trie.root.children[keyword]
 
             keyword_index = 1
             last_index = 0
-            for command in matches:
-                if len(command.keywords) == 1 and not words[index + 1:found_command] and self.is_constructed(
-                        command.keywords, constructed, command.synonyms):
-                    results[index] = command
-                    found_command = index + 1
-                    constructed = []
+            if not words[index + 1:found_command]:
+                for command in node.commands:
+                    if len(command.keywords) == 1:
+                        results[index] = command
+                        found_command = index + 1
 
             for word_index, word in enumerate(words[index + 1:found_command]):
-                matches = self.get_matching_commands(constructed)
-                matches.sort(key=lambda cmd: len(cmd.keywords), reverse=True)
-
-                found_word = False
                 if word_index - last_index > 2:
                     break
-                for command in matches:
-                    if found_word:
-                        break
-                    if keyword_index == len(command.keywords) and self.is_constructed(command.keywords, constructed,
-                                                                                          command.synonyms):
+                for command in node.ranked:
+                    if keyword_index == len(command.keywords):
                         results[index] = command
                         found_command = index + 1
                         keyword_index = 1
                         break
-                    if len(command.keywords) == 1 and self.is_constructed(command.keywords, constructed,
-                                                                          command.synonyms):
+                    if len(command.keywords) == 1:
                         results[index] = command
                         found_command = index + 1
                         keyword_index = 1
                         break
 
-                    if (word == command.keywords[keyword_index] or word in command.synonyms.get(
-                            command.keywords[keyword_index], [])) and self.is_constructed(command.keywords, constructed,
-                                                                                          command.synonyms):
+                    if ids[index + 1 + word_index] in command.accepts[keyword_index]:
                         keyword_index += 1
-                        constructed.append(word)
+                        node = node.children.get(word, EMPTY_NODE)
                         last_index = word_index
-                        found_word = True
                         if keyword_index == len(command.keywords):
                             results[index] = command
                             found_command = index + 1
                             keyword_index = 1
-                            break
+                        break
 
         if results and previous_index is not None and results.get(previous_index, None) is not None:
             if results.get(previous_index).continues:
@@ -133,26 +527,14 @@ class Manager:
 
         used_indices = set()
 
-        def matches_keyword(word1, keyword1, synonyms):
-            if word1 == keyword1:
-                return True
-            if keyword1 in synonyms and word1 in synonyms[keyword1]:
-                return True
-            return False
-
         for start_index in sorted(results.keys()):
             command = results[start_index]
-            command_keywords = command.keywords
-            command_synonyms = command.synonyms
             temp_used_indices = set()
             word_index = 0
 
-            for keyword in command_keywords:
+            for accepted in command.accepts:
                 while word_index < len(words):
-                    if (
-                            word_index not in used_indices
-                            and matches_keyword(words[word_index], keyword, command_synonyms)
-                    ):
+                    if word_index not in used_indices and ids[word_index] in accepted:
                         temp_used_indices.add(word_index)
                         word_index += 1
                         break
@@ -182,12 +564,12 @@ class Manager:
             found = False
             track_command = []
 
-            for word in words[index:boundary]:
-                if word not in result.keywords and all(word not in synonyms for synonyms in result.synonyms.values()):
+            for word, word_id in zip(words[index:boundary], ids[index:boundary]):
+                if word_id not in result.vocabulary:
                     found = True
                     context[number] = [result, context.get(number)[1] + " " + word]
                 else:
-                    track_command.append(next((key for key, value in result.synonyms.items() if word in value), word))
+                    track_command.append(result.canonical.get(word_id, word))
                     if word in track_command and result.keywords[:len(track_command)] != track_command:
                         found = True
                         context[number] = [result, context.get(number)[1] + " " + word]
@@ -225,11 +607,7 @@ class Manager:
         return word_map
 
     def get_matching_commands(self, keywords):
-        if not keywords:
-            return self.commands
-        commands = []
-        for cmd in self.commands:
-            if self.is_constructed(cmd.keywords, keywords, cmd.synonyms):
-                commands.append(cmd)
-
-        return commands
+        node = self.trie.walk(keywords)
+        if node is None:
+            return []
+        return list(node.commands)
@@ -1,41 +1,155 @@
+import sys
 import time
+import threading
+from itertools import islice
 from enum import Enum
+from collections import deque
 from datetime import datetime
+from typing import Deque, Dict, List, Optional, Tuple, Union
+
+
+class EventType(str, Enum):
+    """
+    Event types recorded by the app itself. They compare and hash like their string values
+    """
+    USER_REQUEST = "user_request"
+    COMMAND_DETECTED = "command_detected"
+    WAKE_WORD_USED = "wake_word_used"
+
+    __str__ = str.__str__
+    __format__ = str.__format__
 
 
 class Event:
-    def __init__(self, event_type: str, details: dict = None):
+    """
+    A recorded event. Events are not modified once recorded, so the gpt() text is rendered only once
+    """
+    __slots__ = ("type", "details", "timestamp", "_gpt")
+
+    def __init__(self, event_type: Union[EventType, str], details: dict = None, timestamp: float = None):
         if not details:
             details = {}
 
-        self.type = event_type
+        try:
+            self.type = EventType(event_type)
+        except ValueError:
+            self.type = sys.intern(event_type)
         self.details = details
-        self.timestamp = time.time()
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self._gpt = None
 
     def gpt(self):
-        event_type_str = f"Type: {self.type}"
-        timestamp_str = f"Timestamp: {datetime.fromtimestamp(self.timestamp).strftime('%Y-%m-%d %H:%M:%S')}"
-        details_str = "Details:\n"
-        for key, value in self.details.items():
-            details_str += f"  {key}: {value}\n"
+        if self._gpt is None:
+            event_type_str = f"Type: {self.type}"
+            timestamp_str = f"Timestamp: {datetime.fromtimestamp(self.timestamp).strftime('%Y-%m-%d %H:%M:%S')}"
+            details_str = "Details:\n"
+            for key, value in self.details.items():
+                details_str += f"  {key}: {value}\n"
 
-        return f"""{event_type_str}
+            self._gpt = f"""{event_type_str}
 {timestamp_str}
 {details_str}"""
+        return self._gpt
+
+    def __repr__(self):
+        return f"Event({self.type!s}, {self.details}, {self.timestamp})"
 
 
 class EventLogger:
-    def __init__(self):
-        self.history = []
+    """
+    Keeps the latest events in a fixed-capacity ring buffer, with a deque of the same events per type,
+    so recording never copies the history and queries only touch the events they return
+    """
+    def __init__(self, capacity: int = 100):
+        self.capacity = capacity
+        self._events: Deque[Event] = deque()
+        self._by_type: Dict[str, Deque[Event]] = {}
+        self._snapshot: Optional[Tuple[Event, ...]] = None
+        self._lock = threading.Lock()
+        self.journal = None
+
+    def attach(self, journal):
+        """
+        Restores the history from an EventJournal and mirrors every following record into it
+        """
+        journal.capacity = self.capacity
+        events = journal.load()
+        with self._lock:
+            for event in reversed(events):  # restored events are older than anything recorded so far
+                self._events.appendleft(event)
+                self._by_type.setdefault(event.type, deque()).appendleft(event)
+            self._snapshot = None
+            self._evict()
+            self.journal = journal
+
+    @property
+    def history(self) -> Tuple[Event, ...]:
+        """
+        An immutable snapshot of the recorded events, oldest first, shared until the next record
+        """
+        with self._lock:
+            if self._snapshot is None:
+                self._snapshot = tuple(self._events)
+            return self._snapshot
 
     def record(self, event: Event):
-        self.history.append(event)
+        with self._lock:
+            self._events.append(event)
+            self._by_type.setdefault(event.type, deque()).append(event)
+            self._snapshot = None
+            self._evict()
+        if self.journal is not None:
+            self.journal.append(event)
+
+    def _evict(self):
+        while len(self._events) > self.capacity:
+            oldest = self._events.popleft()
+            same_type = self._by_type[oldest.type]
+            same_type.popleft()
+            if not same_type:
+                del self._by_type[oldest.type]
+
+    def last(self, n: int, event_type: str = None) -> List[Event]:
+        """
+        The latest n events, optionally of one type, oldest first
+        """
+        with self._lock:
+            events = self._events if event_type is None else self._by_type.get(event_type, ())
+            result = list(islice(reversed(events), n))
+            result.reverse()
+            return result
+
+    def since(self, timestamp: float, event_type: str = None) -> List[Event]:
+        """
+        The events recorded at or after the timestamp, optionally of one type, oldest first
+        """
+        with self._lock:
+            events = self._events if event_type is None else self._by_type.get(event_type, ())
+            result = []
+            for event in reversed(events):
+                if event.timestamp < timestamp:
+                    break
+                result.append(event)
+            result.reverse()
+            return result
 
-    def length(self, limit):
-        difference = len(self.history) > limit
-        if difference:
-            self.history = self.history[len(self.history) - limit:]
+    def length(self, limit: int):
+        """
+        Limits the history to the latest `limit` events
+        """
+        with self._lock:
+            if limit != self.capacity:
+                self.capacity = limit
+                if self.journal is not None:
+                    self.journal.capacity = limit
+                self._snapshot = None
+                self._evict()
 
     def clear(self):
-        self.history = []
+        with self._lock:
+            self._events.clear()
+            self._by_type.clear()
+            self._snapshot = None
 
+    def __len__(self):
+        return len(self._events)
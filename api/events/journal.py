@@ -0,0 +1,114 @@
+import json
+import queue
+import atexit
+import logging
+import sqlite3
+import threading
+
+from pathlib import Path
+from typing import List
+
+from .events import Event
+
+log = logging.getLogger("events: journal")
+
+
+class EventJournal:
+    """
+    Append-only SQLite (WAL) journal of recorded events, so the history survives restarts.
+    Appends are queued and written by a background thread in one transaction per batch (group commit),
+    so recording never waits for the disk.
+    """
+    def __init__(self, path: Path, capacity: int = 100, flush_interval: float = 0.5, compact_every: int = 50):
+        self.path = Path(path)
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self.compact_every = compact_every
+
+        self._queue: "queue.SimpleQueue[Event]" = queue.SimpleQueue()
+        self._closed = threading.Event()
+        self._commits = 0
+        self._lock = threading.Lock()
+
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS events ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, type TEXT NOT NULL, timestamp REAL NOT NULL, details TEXT)"
+        )
+        self._connection.commit()
+
+        self._writer = threading.Thread(target=self._run, name="event-journal", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def load(self) -> List[Event]:
+        """
+        Reads only the latest `capacity` events, oldest first
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT type, timestamp, details FROM events ORDER BY id DESC LIMIT ?", (self.capacity,)
+            ).fetchall()
+
+        events = []
+        for event_type, timestamp, details in reversed(rows):
+            try:
+                events.append(Event(event_type, json.loads(details) if details else None, timestamp))
+            except ValueError as e:
+                log.warning(f"Skipped a broken journal record: {e}")
+        return events
+
+    def append(self, event: Event):
+        if not self._closed.is_set():
+            self._queue.put(event)
+
+    def _run(self):
+        while not self._closed.is_set() or not self._queue.empty():
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._commit(batch)
+
+    def _commit(self, batch: List[Event]):
+        try:
+            with self._lock, self._connection:
+                self._connection.executemany(
+                    "INSERT INTO events (type, timestamp, details) VALUES (?, ?, ?)",
+                    [(event.type, event.timestamp, json.dumps(event.details, default=str)) for event in batch]
+                )
+            self._commits += 1
+            if self._commits % self.compact_every == 0:
+                self.compact()
+        except sqlite3.Error as e:
+            log.error(f"Failed to write {len(batch)} events to the journal: {e}")
+
+    def compact(self):
+        """
+        Drops everything older than the latest `capacity` events
+        """
+        with self._lock, self._connection:
+            self._connection.execute(
+                "DELETE FROM events WHERE id <= (SELECT MAX(id) FROM events) - ?", (self.capacity,)
+            )
+
+    def close(self):
+        """
+        Writes out the queued events and closes the database
+        """
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self._writer.join()
+        try:
+            self.compact()
+            self._connection.close()
+        except sqlite3.Error as e:
+            log.warning(f"Failed to close the event journal: {e}")
@@ -4,56 +4,349 @@ import json
 import hashlib
 import logging
 import time
+import atexit
+import sqlite3
+import threading
 
 from pathlib import Path
 from datetime import datetime
-from typing import Union
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, Optional, Set, Union
 
 from data.constants import APP_NAME, APP_ID, APP_VERSION, CACHING_MARKER_FILENAME
 
 log = logging.getLogger("runtime")
 
 
+_MISSING = object()
+_DELETED = object()
+
+
+class CacheNamespace:
+    """
+    Byte-budget LRU index of the files in one cache subdirectory.
+    Sizes and access order live in memory and in the runtime database, so the request path only moves
+    an entry to the end; scanning for unknown files and evicting is left to the background sweep.
+    """
+    def __init__(self, runtime: "Runtime", name: str, max_bytes: Optional[int] = None, batch: int = 64,
+                 remove: Optional[Callable[[str], None]] = None):
+        self.runtime = runtime
+        self.name = name
+        self.path = runtime.mkdir_cache(name)
+        self.max_bytes = max_bytes
+        self.batch = batch
+        self.remove = remove  # evicts entries that are not plain files in the directory
+        self.total = 0
+
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # file name -> size, least recently used first
+        self._dirty: Dict[str, float] = {}
+        self._removed: Set[str] = set()
+        self._lock = threading.Lock()
+        self._scan: Optional[Iterator[os.DirEntry]] = None
+        self._scanned = remove is not None
+
+        for file, size in runtime.query(
+                "SELECT name, size FROM cache_index WHERE namespace = ? ORDER BY accessed", (name,)):
+            self._entries[file] = size
+            self.total += size
+
+    @property
+    def busy(self) -> bool:
+        return not self._scanned or (self.max_bytes is not None and self.total > self.max_bytes)
+
+    def touch(self, file: str):
+        """
+        Marks a file as just used
+        """
+        with self._lock:
+            if file in self._entries:
+                self._entries.move_to_end(file)
+                self._dirty[file] = time.time()
+
+    def add(self, file: str, size: Optional[int] = None):
+        """
+        Indexes a file that was just written to the namespace directory, or an entry of the given size
+        """
+        if size is None:
+            try:
+                size = (self.path / file).stat().st_size
+            except OSError:
+                return
+        with self._lock:
+            self.total += size - self._entries.get(file, 0)
+            self._entries[file] = size
+            self._entries.move_to_end(file)
+            self._dirty[file] = time.time()
+            self._removed.discard(file)
+
+    def discard(self, file: str):
+        """
+        Drops the entry of a file that was removed from the namespace directory
+        """
+        with self._lock:
+            size = self._entries.pop(file, None)
+            if size is None:
+                return
+            self.total -= size
+            self._dirty.pop(file, None)
+            self._removed.add(file)
+
+    def sweep(self):
+        """
+        One incremental step: indexes a batch of unknown files, evicts up to a batch of least recently used ones
+        while over budget, and persists the index changes
+        """
+        if not self._scanned:
+            self._scan_batch()
+
+        evicted = []
+        with self._lock:
+            while self.max_bytes is not None and self.total > self.max_bytes and self._entries and len(evicted) < self.batch:
+                file, size = self._entries.popitem(last=False)
+                self.total -= size
+                self._dirty.pop(file, None)
+                self._removed.add(file)
+                evicted.append(file)
+
+        for file in evicted:
+            try:
+                if self.remove is not None:
+                    self.remove(file)
+                else:
+                    (self.path / file).unlink(missing_ok=True)
+            except OSError as e:
+                log.warning(f"Failed to evict {file} from {self.name} cache: {e}")
+        if evicted:
+            log.info(f"Evicted {len(evicted)} files from {self.name} cache, {self.total} bytes left")
+
+        self._persist()
+
+    def _scan_batch(self):
+        if self._scan is None:
+            self._scan = os.scandir(self.path)
+        unknown = []
+        for _ in range(self.batch):
+            entry = next(self._scan, None)
+            if entry is None:
+                self._scan.close()
+                self._scanned = True
+                break
+            if entry.is_file() and entry.name not in self._entries:
+                unknown.append(entry)
+
+        with self._lock:
+            for entry in unknown:
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                if entry.name in self._entries:
+                    continue
+                self._entries[entry.name] = stat.st_size
+                self._entries.move_to_end(entry.name, last=False)  # files of unknown age are evicted first
+                self._dirty[entry.name] = stat.st_mtime
+                self.total += stat.st_size
+
+    def _persist(self):
+        with self._lock:
+            dirty = [(self.name, file, self._entries[file], accessed)
+                     for file, accessed in self._dirty.items() if file in self._entries]
+            removed = [(self.name, file) for file in self._removed]
+            self._dirty, self._removed = {}, set()
+        if dirty or removed:
+            self.runtime.execute_many([
+                ("INSERT OR REPLACE INTO cache_index (namespace, name, size, accessed) VALUES (?, ?, ?, ?)", dirty),
+                ("DELETE FROM cache_index WHERE namespace = ? AND name = ?", removed),
+            ])
+
+
 class Runtime:
-    def __init__(self):
+    """
+    Persistent key-value store in the cache directory, backed by SQLite in WAL mode.
+    Reads go through an in-process cache of the serialized values, so every read returns a fresh object.
+    Writes land in the cache at once and are committed by a background thread in batches, each batch
+    in a single transaction.
+    """
+    def __init__(self, flush_interval: float = 1.0):
         self.path = self._get_cache_dir()
         self.runtime_file = self.path / "runtime.json"
+        self.database_file = self.path / "runtime.db"
+        self.flush_interval = flush_interval
         log.info(f"Using preferable caching directory: {self.path}")
 
-    def _load(self):
-        if self.runtime_file.exists():
-            try:
-                with open(self.runtime_file, "r") as f:
-                    return json.load(f)
-            except Exception as e:
-                log.warning(f"Failed to load runtime file: {e}")
-        return {}
+        self._cache: Dict[str, Any] = {}  # key -> serialized value or _DELETED
+        self._pending: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._dirty = threading.Event()
+        self._closed = False
+
+        self.namespaces: Dict[str, CacheNamespace] = {}
+        self.sweep_interval = 30.0
+        self._sweeper: Optional[threading.Thread] = None
 
-    def _save(self, data):
+        self._connection = sqlite3.connect(self.database_file, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS runtime (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS cache_index ("
+            "namespace TEXT NOT NULL, name TEXT NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL, "
+            "PRIMARY KEY (namespace, name))"
+        )
+        self._connection.commit()
+        self._migrate()
+
+        self._writer = threading.Thread(target=self._run, name="runtime-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def _migrate(self):
+        """
+        Moves the entries of the old whole-file runtime.json into the database
+        """
+        if not self.runtime_file.exists():
+            return
         try:
-            with open(self.runtime_file, "w") as f:
-                json.dump(data, f, indent=2)
+            with open(self.runtime_file, "r") as f:
+                data = json.load(f)
+            with self._connection:
+                self._connection.executemany(
+                    "INSERT OR IGNORE INTO runtime (key, value) VALUES (?, ?)",
+                    [(key, json.dumps(value)) for key, value in data.items()]
+                )
+            self.runtime_file.rename(self.runtime_file.with_suffix(".json.migrated"))
+            log.info(f"Migrated {len(data)} runtime entries to {self.database_file}")
         except Exception as e:
-            log.error(f"Failed to write runtime file: {e}")
+            log.warning(f"Failed to migrate runtime file: {e}")
+
+    def _run(self):
+        while not self._closed:
+            self._dirty.wait()
+            time.sleep(self.flush_interval)  # let more writes join the batch
+            self.flush()
+
+    def flush(self):
+        """
+        Commits the pending writes and deletions in one transaction
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._dirty.clear()
+        if not pending:
+            return
+
+        try:
+            with self._db_lock, self._connection:
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO runtime (key, value) VALUES (?, ?)",
+                    [(key, value) for key, value in pending.items() if value is not _DELETED]
+                )
+                self._connection.executemany(
+                    "DELETE FROM runtime WHERE key = ?",
+                    [(key,) for key, value in pending.items() if value is _DELETED]
+                )
+        except sqlite3.Error as e:
+            log.error(f"Failed to write runtime entries: {e}")
+            with self._lock:
+                for key, value in pending.items():
+                    self._pending.setdefault(key, value)
+                self._dirty.set()
 
     def write(self, key, value):
-        data = self._load()
-        data[key] = value
-        self._save(data)
+        try:
+            serialized = json.dumps(value)
+        except (TypeError, ValueError) as e:
+            log.error(f"Failed to write runtime entry {key}: {e}")
+            return
+
+        with self._lock:
+            if self._cache.get(key, _MISSING) == serialized:
+                return
+            self._cache[key] = serialized
+            self._pending[key] = serialized
+            self._dirty.set()
 
     def read(self, key, default=None):
-        data = self._load()
-        return data.get(key, default)
+        with self._lock:
+            value = self._cache.get(key, _MISSING)
+        if value is _MISSING:
+            with self._db_lock:
+                row = self._connection.execute("SELECT value FROM runtime WHERE key = ?", (key,)).fetchone()
+            with self._lock:
+                value = self._cache.setdefault(key, row[0] if row else _DELETED)
+        return default if value is _DELETED else json.loads(value)
 
     def delete(self, key):
-        data = self._load()
-        if key in data:
-            del data[key]
-            self._save(data)
+        with self._lock:
+            if self._cache.get(key, _MISSING) is _DELETED:
+                return
+            self._cache[key] = _DELETED
+            self._pending[key] = _DELETED
+            self._dirty.set()
 
     def clear(self):
-        if self.runtime_file.exists():
-            self.runtime_file.unlink()
+        with self._lock:
+            self._cache.clear()
+            self._pending.clear()
+            with self._db_lock, self._connection:
+                self._connection.execute("DELETE FROM runtime")
+
+    def close(self):
+        """
+        Commits everything still pending, called at exit
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self.flush()
+        self._dirty.set()
+        for namespace in list(self.namespaces.values()):
+            namespace._persist()
+        with self._db_lock:
+            self._connection.close()
+
+    def query(self, sql: str, parameters: tuple = ()) -> list:
+        with self._db_lock:
+            return self._connection.execute(sql, parameters).fetchall()
+
+    def execute_many(self, statements: list):
+        """
+        Runs (sql, rows) pairs with executemany in a single transaction
+        """
+        try:
+            with self._db_lock, self._connection:
+                for sql, rows in statements:
+                    if rows:
+                        self._connection.executemany(sql, rows)
+        except sqlite3.Error as e:
+            log.error(f"Failed to update the runtime database: {e}")
+
+    def cache_namespace(self, name: str, max_bytes: Optional[int] = None,
+                        remove: Optional[Callable[[str], None]] = None) -> CacheNamespace:
+        """
+        Returns the size-bounded index of a cache subdirectory, kept within `max_bytes` by a background sweep.
+        With `remove`, entries are evicted through it instead of being deleted as files
+        """
+        if name not in self.namespaces:
+            self.namespaces[name] = CacheNamespace(self, name, max_bytes, remove=remove)
+            if self._sweeper is None:
+                self._sweeper = threading.Thread(target=self._sweep, name="cache-sweeper", daemon=True)
+                self._sweeper.start()
+        elif max_bytes is not None:
+            self.namespaces[name].max_bytes = max_bytes
+        return self.namespaces[name]
+
+    def _sweep(self):
+        while not self._closed:
+            for namespace in list(self.namespaces.values()):
+                try:
+                    namespace.sweep()
+                except Exception as e:
+                    log.warning(f"Failed to sweep {namespace.name} cache: {e}")
+            # keep going quickly while a first scan or an eviction backlog is unfinished
+            busy = any(namespace.busy for namespace in list(self.namespaces.values()))
+            time.sleep(1.0 if busy else self.sweep_interval)
 
     @staticmethod
     def _get_possible_cache_paths():
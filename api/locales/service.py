@@ -1,5 +1,6 @@
 import json
-from typing import List
+from string import Formatter
+from typing import List, Tuple
 import random
 import yaml
 
@@ -8,6 +9,48 @@ import logging
 log = logging.getLogger("locale")
 
 
+def template_segments(template: str, values: dict) -> List[Tuple[str, bool]]:
+    """
+    Splits a formatted template into (text, static) parts: the template's own prose and the slot values.
+    Parts without letters or digits (spaces, punctuation) are attached to the part before them.
+    """
+    formatter = Formatter()
+    parts = []
+    for literal, field, spec, conversion in formatter.parse(template):
+        if literal:
+            parts.append((literal, True))
+        if field is not None:
+            value = formatter.convert_field(formatter.get_field(field, (), values)[0], conversion)
+            parts.append((formatter.format_field(value, spec), False))
+
+    merged = []
+    for text, static in parts:
+        if static and not any(char.isalnum() for char in text):
+            if merged:
+                merged[-1][0] += text
+            continue
+        if merged and merged[-1][1] == static:
+            merged[-1][0] += text
+        else:
+            merged.append([text, static])
+    return [(text.strip(), static) for text, static in merged if text.strip()]
+
+
+class Rendered(str):
+    """
+    A translated string that remembers the template and the values it was formatted from,
+    so text-to-speech can reuse the audio of the template's fixed prose
+    """
+    def __new__(cls, text: str, template: str, values: dict):
+        rendered = super().__new__(cls, text)
+        rendered.template = template
+        rendered.values = values
+        return rendered
+
+    def segments(self) -> List[Tuple[str, bool]]:
+        return template_segments(self.template, self.values)
+
+
 class Locale:
     def __init__(self, lang, path):
         self.lang = lang
@@ -69,9 +112,10 @@ class LocaleService:
             raw = random.choice(raw)
 
         try:
-            return raw.format(**kwargs)
+            text = raw.format(**kwargs)
         except Exception:
             return raw
+        return Rendered(text, raw, kwargs) if kwargs and text != raw else text
 
 
 
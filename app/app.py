@@ -52,10 +52,30 @@ class App:
 
         self.tree_init()
 
+        self.trigger_automaton = KeywordAutomaton(self.config["settings"]["trigger"]["triggers"])
+
+        # a misheard trigger wakes the assistant, so it is corrected by at most one edit and only in longer words
+        fuzzy = self.config["settings"].get("fuzzy-matching") or {}
+        self.trigger_fuzzy = self.api.FuzzyIndex(
+            self.config["settings"]["trigger"]["triggers"], min(1, int(fuzzy.get("max-distance", 2))), min_length=6
+        ) if fuzzy.get("enable") else None
+
         log.debug(f"Active scenarios: {[scenario.name for scenario in self.api.scenarios]}")
 
         self.scenario_active = []
 
+        # partial results carry no speaker vector, so early commits are unavailable with speaker recognition
+        self.partial_results = self.config["audio"]["stt"].get("partial-results", False) and not \
+            self.config["audio"]["stt"]["speaker-recognition"]
+        self.partial_matcher = self.api.manager.partial_matcher()
+
+        if self.config["audio"]["tts"].get("warm-up"):
+            self.api.warm_up_tts()
+
+        # the model is otherwise loaded by the first phrase missing from the tts cache
+        if self.config["audio"]["tts"].get("preload") and not self.config["settings"]["text-mode"]:
+            self.api.preload_tts()
+
         # self.api.__save_config__()
 
         log.debug("Finished app initialization")
@@ -89,12 +109,16 @@ class App:
                     f"Going into sleep mode due to inactivity for {threshold} seconds (~{threshold / 60} minutes)")
                 self.running = False
             data = self.stt.stream.read(1024, exception_on_overflow=False)
+            finalized = False
             for word in self.stt.listen(data):
+                finalized = True
                 self.process_trigger(word)
+            if self.partial_results and not finalized:
+                self.process_partial(self.stt.partial())
 
     def handle(self, request):
         self.api.eventLogger.record(self.api.Event(
-            "user_request",
+            self.api.EventType.USER_REQUEST,
             {"request": request}
         ))
 
@@ -103,12 +127,13 @@ class App:
         if (not request or not self.remove_trigger_word(request)) and self.config["settings"]["trigger"]["trigger-mode"] != "disabled" and not self.scenario_active:
             self.api.__no_command_default__(context=None, history=None)
         else:
-            result, execution_time = track_time(lambda: self.api.manager.find(request))
+            result, execution_time = track_time(lambda: self.api.manager.find_cached(request))
+            cache = self.api.manager.cache
             if result:
                 self.last_time = time.time()
 
                 result_visual = {" ".join(cmd[0].keywords): cmd[1] for cmd in result}
-                log.info(f"Command search time: {execution_time:.6f}")
+                log.info(f"Command search time: {execution_time:.6f} (cache: {cache.hits} hits, {cache.misses} misses)")
                 log.debug(f"Recognized commands: {result_visual}")
 
                 answer = None
@@ -117,13 +142,13 @@ class App:
                     command = result[0]
                     if command[0].responses and not command[0].tts:
                         answer = random.choice(command[0].responses)
-                        self.api.say(answer)
+                        self.api.say(answer, interrupt=True)
                     elif not command[0].responses and not command[0].tts:
                         answer = random.choice(self.config["answers"]["multi"])
-                        self.api.say(answer)
+                        self.api.say(answer, interrupt=True)
 
                     self.api.eventLogger.record(self.api.Event(
-                        "command_detected",
+                        self.api.EventType.COMMAND_DETECTED,
                         {
                             "user_request": request,
                             "commands": result_visual,
@@ -134,10 +159,10 @@ class App:
                 elif len(result) > 1:
                     if all(not command[0].tts for command in result):
                         answer = random.choice(self.config["answers"]["multi"])
-                        self.api.say(answer)
+                        self.api.say(answer, interrupt=True)
 
                     self.api.eventLogger.record(self.api.Event(
-                        "command_detected",
+                        self.api.EventType.COMMAND_DETECTED,
                         {
                             "user_request": request,
                             "commands": result_visual,
@@ -158,10 +183,31 @@ class App:
                 if self.config["settings"]["trigger"]["trigger-mode"] == "timed":
                     self.trigger_timed_needed = False
                     self.trigger_counter(int(self.config["settings"]["trigger"]["trigger-time"]))
-                self.handle(result)
+                self.handle_final(result)
+            else:
+                self.partial_matcher.resolve(None)
         else:
+            self.handle_final(request)
+
+    def process_partial(self, request):
+        """
+        Runs a command from a partial recognition result as soon as it can not change anymore
+        """
+        if request and self.trigger_timed_needed:
+            trigger, request = self.remove_trigger_word(request)
+            if request == "blank":
+                return
+
+        if self.partial_matcher.feed(request):
+            log.info(f"Command committed from a partial result: {request}")
             self.handle(request)
 
+    def handle_final(self, request):
+        if self.partial_matcher.resolve(request):
+            log.debug(f"Final result confirmed the command committed from a partial result: {request}")
+            return
+        self.handle(request)
+
     def process_trigger_no_voice(self, request):
         trigger, result = self.remove_trigger_word(request)
         if result != "blank":
@@ -171,12 +217,22 @@ class App:
 
     def remove_trigger_word(self, request):
         """
-        Removes trigger words from the input
+        Removes trigger words from the input, returns the first trigger found and the words after it
         """
-        for trigger in self.config["settings"]["trigger"][f"triggers"]:
-            if trigger in request:
-                request = " ".join(request.split(trigger)[1:])[1:]
-                return trigger, request
+        words = request.split()
+        spans = self.trigger_automaton.matches(words)
+        if spans:
+            start, end, trigger = spans[0]
+            repeated = {index for span_start, span_end, _ in spans[1:] for index in range(span_start, span_end)}
+            return trigger, " ".join(word for index, word in enumerate(words[end:], end) if index not in repeated)
+        if self.trigger_fuzzy:
+            command_words = self.api.manager.words
+            for index, word in enumerate(words):
+                if word in command_words:
+                    continue
+                trigger = self.trigger_fuzzy.lookup(word)
+                if trigger:
+                    return trigger, " ".join(words[index + 1:])
         return "blank", "blank"
 
     def trigger_counter(self, times):
@@ -189,6 +245,12 @@ class App:
         log.info("Trigger countdown ended")
 
     def tree_init(self):
+        self.api.manager.cache.maxsize = int(self.config["settings"].get("command-cache-size", 256))
+
+        fuzzy = self.config["settings"].get("fuzzy-matching") or {}
+        if fuzzy.get("enable"):
+            self.api.manager.enable_fuzzy(int(fuzzy.get("max-distance", 2)))
+
         commands = self.config["commands"]["default"]
         commands_repeat = self.config["commands"]["repeat"]
 
@@ -201,7 +263,8 @@ class App:
                 command.get(f"synonyms", {}),
                 command.get("equivalents", []),
                 command.get("tts", False),
-                command.get("continues", False)
+                command.get("continues", False),
+                command.get("early", False)
             )
 
         for repeat in commands_repeat:
@@ -215,10 +278,12 @@ class App:
                     repeat.get(f"synonyms"),
                 )
 
-        log.info("Command manager initialized")
+        log.info(f"Command manager initialized: {len(self.api.manager.commands)} commands, "
+                 f"{self.api.manager.trie.size()} keyword trie nodes")
 
     def add_command(self, com: list, action: str, parameters: dict = None, responses: list = None,
-                    synonyms: dict = None, equivalents: list = None, tts: bool = False, continues: bool = False):
+                    synonyms: dict = None, equivalents: list = None, tts: bool = False, continues: bool = False,
+                    early: bool = False):
         if equivalents is None:
             equivalents = []
 
@@ -230,21 +295,14 @@ class App:
             synonyms=synonyms,
             equivalents=equivalents,
             tts=tts,
-            continues=continues
+            continues=continues,
+            early=early
         )
 
         self.api.manager.add(command)
 
     def scan_scenarios(self, request):
-        user_requests = [event for event in self.api.eventLogger.history if event.type == "user_request"]
-
-        updated_scenarios = []
-
-        for scenario in self.api.scenarios:
-            if scenario.check_scenario(request, user_requests):
-                updated_scenarios.append(scenario)
-
-        self.scenario_active = updated_scenarios
+        self.scenario_active = self.api.scenarios.check(request)
 
     def do(self, command):
         """
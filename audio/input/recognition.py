@@ -152,6 +152,14 @@ class STT:
                     log.info(f"Text recognized: {answer['text']}")
                     return answer["text"]
 
+    def partial(self):
+        """
+        Return the words recognized so far in the current utterance.
+
+        Vosk resets the partial result every time an utterance is finalized.
+        """
+        return json.loads(self.recognizer.PartialResult()).get("partial", "")
+
     def check_speaker(self, data):
         if config["audio"]["stt"]["speaker-recognition"]:
             if self.recognizer.AcceptWaveform(data):
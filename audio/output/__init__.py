@@ -0,0 +1,4 @@
+from .playback import Clip, PcmCache, AudioOutput
+from .archive import ClipArchive
+
+__all__ = ["Clip", "PcmCache", "AudioOutput", "ClipArchive"]
@@ -0,0 +1,206 @@
+import os
+import json
+import mmap
+import logging
+import threading
+
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from .playback import Clip
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+log = logging.getLogger("playback: archive")
+
+CODECS = ("none", "lz4")
+
+
+class ClipArchive:
+    """
+    Clips packed into one append-only blob file that is read through mmap, with an offset index in a sidecar file.
+    Deleted clips leave garbage in the blob until it outweighs the live data and the archive is rewritten
+    into the next generation of files.
+
+    The "lz4" codec is lossless: 16-bit samples are stored as differences to the previous sample, which compress
+    far better than raw PCM. With "none" a lookup returns a view into the mapping without copying.
+    """
+    def __init__(self, directory: Path, codec: str = "lz4", min_compaction: int = 1024 * 1024):
+        if codec not in CODECS:
+            raise ValueError(f"Unknown clip archive codec {codec}, expected one of {CODECS}")
+        if codec == "lz4" and lz4 is None:
+            log.warning("lz4 is not installed, clips will be stored uncompressed")
+            codec = "none"
+
+        self.directory = Path(directory)
+        self.codec = codec
+        self.min_compaction = min_compaction
+
+        self.live = 0
+        self.garbage = 0
+        self._index: Dict[str, Tuple[int, int, int, int, int, str]] = {}  # offset, length, rate, channels, width, codec
+        self._lock = threading.RLock()
+        self._map: Optional[mmap.mmap] = None
+        self._mapped = 0
+
+        self.generation = self._latest_generation()
+        self._open()
+
+    def _paths(self, generation: int) -> Tuple[Path, Path]:
+        return self.directory / f"clips-{generation}.bin", self.directory / f"clips-{generation}.idx"
+
+    def _latest_generation(self) -> int:
+        """
+        The newest generation with an index. The index of a generation is written after its blob,
+        so its presence means the blob is complete. Leftovers of other generations are removed.
+        """
+        generations = sorted(int(path.stem.split("-")[1]) for path in self.directory.glob("clips-*.idx"))
+        latest = generations[-1] if generations else 0
+        for path in self.directory.glob("clips-*.*"):
+            if int(path.stem.split("-")[1]) != latest:
+                path.unlink(missing_ok=True)
+        return latest
+
+    def _open(self):
+        blob_path, index_path = self._paths(self.generation)
+        self._blob = open(blob_path, "ab")
+        blob_size = self._blob.tell()
+
+        self._index.clear()
+        self.live = self.garbage = 0
+        if index_path.exists():
+            with open(index_path, "r", encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # a line torn by a crash
+                    self._apply(record, blob_size)
+        self._index_file = open(index_path, "a", encoding="utf-8")
+        self._remap()
+
+    def _apply(self, record: dict, blob_size: int):
+        previous = self._index.pop(record["name"], None)
+        if previous is not None:
+            self.live -= previous[1]
+            self.garbage += previous[1]
+        if record.get("deleted") or record["offset"] + record["length"] > blob_size:
+            return
+        self._index[record["name"]] = (record["offset"], record["length"], record["rate"], record["channels"],
+                                       record["width"], record["codec"])
+        self.live += record["length"]
+
+    def _remap(self):
+        """
+        Maps the blob again after it grew. Clips still holding views into the old mapping keep it alive.
+        """
+        self._blob.flush()
+        size = os.path.getsize(self._blob.name)
+        if size == 0:
+            self._map, self._mapped = None, 0
+            return
+        with open(self._blob.name, "rb") as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._mapped = size
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._index
+
+    def __len__(self):
+        return len(self._index)
+
+    def size(self, name: str) -> int:
+        entry = self._index.get(name)
+        return entry[1] if entry else 0
+
+    def get(self, name: str) -> Optional[Clip]:
+        with self._lock:
+            entry = self._index.get(name)
+            if entry is None:
+                return None
+            offset, length, rate, channels, width, codec = entry
+            if offset + length > self._mapped:
+                self._remap()
+            data = memoryview(self._map)[offset:offset + length]
+        return Clip(self._decode(data, codec, width), rate, channels, width)
+
+    def put(self, name: str, clip: Clip):
+        data = self._encode(clip)
+        with self._lock:
+            offset = self._blob.tell()
+            self._blob.write(data)
+            self._blob.flush()
+            self._write_record({"name": name, "offset": offset, "length": len(data), "rate": clip.rate,
+                                "channels": clip.channels, "width": clip.width, "codec": self.codec})
+
+    def delete(self, name: str):
+        with self._lock:
+            if name not in self._index:
+                return
+            self._write_record({"name": name, "deleted": True})
+            if self.garbage > max(self.live, self.min_compaction):
+                self.compact()
+
+    def _write_record(self, record: dict):
+        self._index_file.write(json.dumps(record) + "\n")
+        self._index_file.flush()
+        self._apply(record, self._blob.tell())
+
+    def compact(self):
+        """
+        Rewrites the live clips into the next generation of files and drops the garbage
+        """
+        with self._lock:
+            generation = self.generation + 1
+            blob_path, index_path = self._paths(generation)
+            self._blob.flush()
+            records = []
+            with open(blob_path, "wb") as blob:
+                for name, (offset, length, rate, channels, width, codec) in self._index.items():
+                    if offset + length > self._mapped:
+                        self._remap()
+                    records.append({"name": name, "offset": blob.tell(), "length": length, "rate": rate,
+                                    "channels": channels, "width": width, "codec": codec})
+                    blob.write(self._map[offset:offset + length])
+                blob.flush()
+                os.fsync(blob.fileno())
+            with open(index_path, "w", encoding="utf-8") as file:
+                file.writelines(json.dumps(record) + "\n" for record in records)
+                file.flush()
+                os.fsync(file.fileno())
+
+            self._blob.close()
+            self._index_file.close()
+            for path in self._paths(self.generation):
+                path.unlink(missing_ok=True)
+            log.info(f"Compacted clip archive: {len(records)} clips, {self.garbage} bytes of garbage dropped")
+            self.generation = generation
+            self._open()
+
+    def close(self):
+        with self._lock:
+            self._blob.close()
+            self._index_file.close()
+
+    def _encode(self, clip: Clip) -> bytes:
+        if self.codec == "none":
+            return bytes(clip.frames)
+        frames = clip.frames
+        if clip.width == 2:
+            samples = np.frombuffer(frames, dtype=np.int16)
+            frames = np.diff(samples, prepend=np.int16(0)).astype(np.int16).tobytes()
+        return lz4.frame.compress(frames)
+
+    @staticmethod
+    def _decode(data: memoryview, codec: str, width: int):
+        if codec == "none":
+            return data
+        frames = lz4.frame.decompress(data)
+        if width == 2:
+            frames = np.cumsum(np.frombuffer(frames, dtype=np.int16), dtype=np.int16).tobytes()
+        return frames
@@ -0,0 +1,174 @@
+import wave
+import queue
+import logging
+import threading
+
+from collections import OrderedDict
+from typing import List, Optional
+
+import numpy as np
+import pyaudio
+
+log = logging.getLogger("playback")
+
+
+class Clip:
+    """
+    Decoded PCM audio kept in memory. `frames` is a read-only memoryview, so slicing it never copies
+    """
+    __slots__ = ("frames", "rate", "channels", "width")
+
+    def __init__(self, frames: bytes, rate: int, channels: int = 1, width: int = 2):
+        self.frames = memoryview(frames)
+        self.rate = rate
+        self.channels = channels
+        self.width = width
+
+    @classmethod
+    def from_wav(cls, path: str) -> "Clip":
+        with wave.open(str(path), "rb") as file:
+            return cls(file.readframes(file.getnframes()), file.getframerate(), file.getnchannels(), file.getsampwidth())
+
+    @classmethod
+    def join(cls, clips: List["Clip"]) -> "Clip":
+        """
+        Concatenates clips of the same format
+        """
+        first = clips[0]
+        return cls(b"".join(clip.frames for clip in clips), first.rate, first.channels, first.width)
+
+    @classmethod
+    def splice(cls, clips: List["Clip"], crossfade: float = 0.02, threshold: int = 300) -> "Clip":
+        """
+        Joins 16-bit mono clips with the silence around each one trimmed and a short linear crossfade at every seam
+        """
+        first = clips[0]
+        if first.width != 2 or first.channels != 1:
+            return cls.join(clips)
+
+        overlap = int(first.rate * crossfade)
+        padding = int(first.rate * 0.03)
+        result = np.zeros(0, dtype=np.float32)
+        for clip in clips:
+            samples = np.frombuffer(clip.frames, dtype=np.int16)
+            loud = np.flatnonzero(np.abs(samples.astype(np.int32)) > threshold)
+            if loud.size:
+                samples = samples[max(0, loud[0] - padding):loud[-1] + padding]
+            samples = samples.astype(np.float32)
+
+            length = min(overlap, len(result), len(samples))
+            if length:
+                fade = np.linspace(0.0, 1.0, length, dtype=np.float32)
+                result[-length:] = result[-length:] * (1.0 - fade) + samples[:length] * fade
+                samples = samples[length:]
+            result = np.concatenate([result, samples])
+
+        return cls(np.clip(result, -32768, 32767).astype(np.int16).tobytes(), first.rate, 1, 2)
+
+    def to_wav(self, path: str):
+        with wave.open(str(path), "wb") as file:
+            file.setnchannels(self.channels)
+            file.setsampwidth(self.width)
+            file.setframerate(self.rate)
+            file.writeframes(self.frames)
+
+    @property
+    def format(self) -> tuple:
+        return self.rate, self.channels, self.width
+
+    def __len__(self):
+        return len(self.frames)
+
+
+class PcmCache:
+    """
+    Byte-bounded LRU of decoded clips, so hot phrases are played without touching the disk
+    """
+    def __init__(self, max_bytes: int = 16 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.total = 0
+        self._clips: "OrderedDict[str, Clip]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Clip]:
+        with self._lock:
+            clip = self._clips.get(key)
+            if clip is not None:
+                self._clips.move_to_end(key)
+            return clip
+
+    def put(self, key: str, clip: Clip):
+        if len(clip) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._clips.pop(key, None)
+            if previous is not None:
+                self.total -= len(previous)
+            self._clips[key] = clip
+            self.total += len(clip)
+            while self.total > self.max_bytes:
+                _, evicted = self._clips.popitem(last=False)
+                self.total -= len(evicted)
+
+
+class AudioOutput:
+    """
+    One long-lived output stream fed by a playback thread. The stream is reopened only when the audio format changes.
+    """
+    def __init__(self, chunk_frames: int = 1024):
+        self.chunk_frames = chunk_frames
+        self._queue: "queue.SimpleQueue[tuple]" = queue.SimpleQueue()
+        self._generation = 0
+        self._audio: Optional[pyaudio.PyAudio] = None
+        self._stream = None
+        self._format: Optional[tuple] = None
+        self._player = threading.Thread(target=self._run, name="audio-output", daemon=True)
+        self._player.start()
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def play(self, clip: Clip, generation: Optional[int] = None):
+        """
+        Queues a clip and returns at once. A clip queued with an older `generation` than the current one
+        was cleared before it was even queued, and is dropped.
+        """
+        self._queue.put((self._generation if generation is None else generation, clip))
+
+    def clear(self):
+        """
+        Drops the queued clips and cuts the one that is playing
+        """
+        self._generation += 1
+
+    def _open(self, clip: Clip):
+        if self._audio is None:
+            self._audio = pyaudio.PyAudio()
+        if self._stream is not None:
+            self._stream.close()
+        self._stream = self._audio.open(
+            format=self._audio.get_format_from_width(clip.width),
+            channels=clip.channels,
+            rate=clip.rate,
+            output=True,
+            frames_per_buffer=self.chunk_frames,
+        )
+        self._format = clip.format
+
+    def _run(self):
+        while True:
+            generation, clip = self._queue.get()
+            if generation != self._generation:
+                continue
+            try:
+                if clip.format != self._format:
+                    self._open(clip)
+                step = self.chunk_frames * clip.channels * clip.width
+                for start in range(0, len(clip.frames), step):
+                    if generation != self._generation:
+                        break
+                    self._stream.write(clip.frames[start:start + step])
+            except Exception as e:
+                log.error(f"Failed to play audio: {e}")
+                self._format = None
@@ -1,3 +1,5 @@
-from .synthesis import TTS
+from .synthesis import TTS, ModelLoadError, split_sentences
+from .warmup import Warmup
+from .worker import SpeechWorker
 
-__all__ = ["TTS"]
+__all__ = ["TTS", "ModelLoadError", "split_sentences", "Warmup", "SpeechWorker"]
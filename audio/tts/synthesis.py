@@ -1,5 +1,7 @@
 import threading
 import os
+import gc
+import re
 import logging
 import inspect
 from pathlib import Path
@@ -31,36 +33,142 @@ ENABLE = config["audio"]["tts"]["enable"]
 
 log = logging.getLogger("tts")
 
+SENTENCE_END = re.compile(r"(?<=[.!?…;:])\s+|\n+")
+
+
+def split_sentences(text: str, min_length: int = 40) -> list:
+    """
+    Splits text into sentence chunks for streaming synthesis.
+    Short sentences are merged with the following ones, so every chunk is long enough to keep natural prosody.
+    """
+    chunks = []
+    current = ""
+    for sentence in SENTENCE_END.split(text.strip()):
+        if not sentence.strip():
+            continue
+        current = f"{current} {sentence.strip()}" if current else sentence.strip()
+        if len(current) >= min_length:
+            chunks.append(current)
+            current = ""
+    if current:
+        if chunks and len(current) < min_length // 2:
+            chunks[-1] = f"{chunks[-1]} {current}"
+        else:
+            chunks.append(current)
+    return chunks
+
+
+class ModelLoadError(RuntimeError):
+    pass
+
 
 class TTS:
+    """
+    Silero text-to-speech. The model is loaded on the first synthesis (or by `load_async`),
+    and unloaded again after `idle-unload-minutes` without use to free memory.
+    """
     def __init__(self):
         if not os.path.exists(f"{PROJECT_DIR}/audio/tts/models"):
             os.makedirs(f"{PROJECT_DIR}/audio/tts/models")
-        self.model = Model(MODEL, f"{PROJECT_DIR}/audio/tts/models/{MODEL}.pt")
-        self.model.set_speaker(SPEAKER)
-        log.debug(f"text-to-speech model configured. lang: {LANG}, speaker {SPEAKER} set")
+        self.model = None
+        self.synthesizer = None
 
-        self.synthesizer = Synthesizer(self.model)
-        log.debug(f"Synthesizer configured")
+        self.idle_unload = config["audio"]["tts"].get("idle-unload-minutes", 0) * 60
+        self._last_used = time.time()
+        self._idle_timer = None
+        self._lock = threading.RLock()
 
         self.active = ENABLE
 
-    def say(self, text, no_audio=False, prosody=94, speaker=SPEAKER, path=f"{PROJECT_DIR}/audio/tts/audio.wav"):
-        func = self.synthesizer.say if not no_audio else self.synthesizer.synthesize
-        text = parse_config_answers(text)
-
-        if speaker in self.model.speakers:
-            self.model.set_speaker(speaker)
+    @property
+    def loaded(self) -> bool:
+        return self.synthesizer is not None
+
+    def load(self):
+        """
+        Loads the model and the synthesizer, unless they are loaded already
+        """
+        with self._lock:
+            if self.loaded:
+                return
+            started = time.time()
+            try:
+                self.model = Model(MODEL, f"{PROJECT_DIR}/audio/tts/models/{MODEL}.pt")
+                self.model.set_speaker(SPEAKER)
+                log.debug(f"text-to-speech model configured. lang: {LANG}, speaker {SPEAKER} set")
+
+                self.synthesizer = Synthesizer(self.model)
+            except Exception as e:
+                self.model = None
+                raise ModelLoadError(f"Failed to load text-to-speech model {MODEL}: {e}") from e
+            log.info(f"Text-to-speech model loaded in {time.time() - started:.2f}s")
+            self._used()
+
+    def load_async(self) -> threading.Thread:
+        """
+        Loads the model in a background thread
+        """
+        thread = threading.Thread(target=self._load_quietly, name="tts-load", daemon=True)
+        thread.start()
+        return thread
+
+    def _load_quietly(self):
+        try:
+            self.load()
+        except Exception as e:
+            log.warning(f"Failed to load the text-to-speech model in the background: {e}")
+
+    def unload(self):
+        """
+        Frees the model, the next synthesis loads it again
+        """
+        with self._lock:
+            if not self.loaded:
+                return
+            self.model = None
+            self.synthesizer = None
+            gc.collect()
+            log.info("Text-to-speech model unloaded")
+
+    def _used(self):
+        self._last_used = time.time()
+        if self.idle_unload > 0 and self._idle_timer is None:
+            self._schedule_unload(self.idle_unload)
+
+    def _schedule_unload(self, delay: float):
+        self._idle_timer = threading.Timer(delay, self._unload_if_idle)
+        self._idle_timer.daemon = True
+        self._idle_timer.start()
+
+    def _unload_if_idle(self):
+        with self._lock:
+            idle = time.time() - self._last_used
+            if idle < self.idle_unload:
+                self._schedule_unload(self.idle_unload - idle)
+                return
+            self._idle_timer = None
+            log.debug(f"Text-to-speech model idle for {idle / 60:.1f} minutes")
+            self.unload()
 
-        kwargs = {
-            "text": text,
-            "path": path,
-            "prosody_rate": prosody,
-        }
-        if not no_audio:
-            kwargs["module"] = "playsound"
-
-        func(**kwargs)
+    def say(self, text, no_audio=False, prosody=94, speaker=SPEAKER, path=f"{PROJECT_DIR}/audio/tts/audio.wav"):
+        with self._lock:
+            self.load()
+            func = self.synthesizer.say if not no_audio else self.synthesizer.synthesize
+            text = parse_config_answers(text)
+
+            if speaker in self.model.speakers:
+                self.model.set_speaker(speaker)
+
+            kwargs = {
+                "text": text,
+                "path": path,
+                "prosody_rate": prosody,
+            }
+            if not no_audio:
+                kwargs["module"] = "playsound"
+
+            func(**kwargs)
+            self._used()
         called_from()
 
-        log.debug(text)
\ No newline at end of file
+        log.debug(text)
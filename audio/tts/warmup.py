@@ -0,0 +1,70 @@
+import time
+import logging
+import threading
+
+from typing import Callable, List
+
+from .synthesis import ModelLoadError
+
+log = logging.getLogger("tts: warmup")
+
+
+class Warmup:
+    """
+    Background job that synthesizes a list of phrases ahead of time, one by one until it is stopped.
+    It gives up on the rest when the model can not be loaded.
+    """
+    def __init__(self, phrases: List[str], synthesize: Callable[[str], bool]):
+        self.phrases = phrases
+        self.synthesize = synthesize
+
+        self.done = 0
+        self.cached = 0
+        self.failed = 0
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="tts-warmup", daemon=True)
+
+    @property
+    def total(self) -> int:
+        return len(self.phrases)
+
+    @property
+    def progress(self) -> float:
+        """
+        Share of phrases processed so far, from 0 to 1
+        """
+        return (self.done + self.cached + self.failed) / self.total if self.phrases else 1.0
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        started = time.time()
+        log.info(f"Pre-synthesizing {self.total} static phrases")
+        for phrase in self.phrases:
+            if self._stop.is_set():
+                break
+
+            try:
+                if self.synthesize(phrase):
+                    self.done += 1
+                else:
+                    self.cached += 1
+            except ModelLoadError as e:
+                self.failed += 1
+                log.error(f"Stopped pre-synthesis: {e}")
+                break
+            except Exception as e:
+                self.failed += 1
+                log.warning(f"Failed to pre-synthesize {phrase!r}: {e}")
+
+            processed = self.done + self.cached + self.failed
+            if processed % 25 == 0:
+                log.debug(f"Pre-synthesis progress: {processed}/{self.total}")
+
+        log.info(f"Pre-synthesis finished in {time.time() - started:.1f}s: {self.done} synthesized, "
+                 f"{self.cached} already cached, {self.failed} failed")
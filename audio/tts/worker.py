@@ -0,0 +1,126 @@
+import heapq
+import logging
+import itertools
+import threading
+
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+log = logging.getLogger("tts: worker")
+
+
+class Utterance:
+    """
+    A queued synthesis job. `done` is set once it ran or was cancelled, `error` holds what the job raised
+    """
+    __slots__ = ("priority", "order", "key", "job", "cancelled", "done", "result", "error")
+
+    def __init__(self, priority: int, order: int, key: Hashable, job: Callable[[], Any]):
+        self.priority = priority
+        self.order = order
+        self.key = key
+        self.job = job
+        self.cancelled = False
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+    def __lt__(self, other: "Utterance"):
+        return (self.priority, self.order) < (other.priority, other.order)
+
+    def wait(self, timeout: float = None) -> bool:
+        """
+        Waits for the job, returns whether it actually ran. The exception of a failed job is raised again here
+        """
+        self.done.wait(timeout)
+        if self.error is not None:
+            raise self.error
+        return self.done.is_set() and not self.cancelled
+
+
+class SpeechWorker:
+    """
+    A single long-lived thread that runs synthesis jobs from a priority queue.
+    Pending jobs with the same key are coalesced, `cancel` drops the pending and running jobs of a priority
+    (stale replies), and the queue is bounded: background jobs wait for room, replies push out the oldest
+    pending reply instead.
+    """
+    REPLY = 0
+    BACKGROUND = 10
+
+    def __init__(self, max_pending: int = 8):
+        self.max_pending = max_pending
+
+        self._heap: List[Utterance] = []
+        self._pending: Dict[Hashable, Utterance] = {}
+        self._order = itertools.count()
+        self._condition = threading.Condition()
+        self.current: Optional[Utterance] = None
+
+        self._thread = threading.Thread(target=self._run, name="tts-worker", daemon=True)
+        self._thread.start()
+
+    def submit(self, key: Hashable, job: Callable[[], Any], priority: int = REPLY) -> Utterance:
+        with self._condition:
+            pending = self._pending.get(key)
+            if pending is not None:
+                if priority < pending.priority:  # a reply overtakes the same phrase queued in the background
+                    pending.priority = priority
+                    heapq.heapify(self._heap)
+                return pending
+
+            if priority >= self.BACKGROUND:
+                while len(self._pending) >= self.max_pending // 2:
+                    self._condition.wait()
+            elif len(self._pending) >= self.max_pending:
+                oldest = min((utterance for utterance in self._pending.values() if utterance.priority == priority),
+                             key=lambda utterance: utterance.order, default=None)
+                if oldest is not None:
+                    log.debug(f"Speech queue is full, dropping {oldest.key}")
+                    self._cancel(lambda utterance: utterance is oldest)
+
+            utterance = Utterance(priority, next(self._order), key, job)
+            heapq.heappush(self._heap, utterance)
+            self._pending[key] = utterance
+            self._condition.notify_all()
+            return utterance
+
+    def cancel(self, priority: int = REPLY):
+        """
+        Cancels the pending and running jobs of the given priority
+        """
+        with self._condition:
+            self._cancel(lambda utterance: utterance.priority == priority)
+
+    def _cancel(self, condition: Callable[[Utterance], bool]):
+        if self.current is not None and condition(self.current):
+            self.current.cancelled = True  # a running job checks the flag between its steps
+        for key, utterance in list(self._pending.items()):
+            if condition(utterance):
+                utterance.cancelled = True
+                utterance.done.set()
+                del self._pending[key]
+        self._condition.notify_all()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._heap:
+                    self._condition.wait()
+                utterance = heapq.heappop(self._heap)
+                if utterance.cancelled:
+                    continue
+                del self._pending[utterance.key]
+                self.current = utterance
+                self._condition.notify_all()
+
+            try:
+                utterance.result = utterance.job()
+            except Exception as e:
+                utterance.error = e
+                log.error(f"Speech job {utterance.key} failed: {e}")
+            finally:
+                self.current = None
+                utterance.done.set()
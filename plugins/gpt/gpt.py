@@ -166,7 +166,7 @@ def current_time_context():
     pass
 
 
-def construct(request, history):
+def construct(request):
     context = "No specific context" if not config["plugins"]["gpt"]["context"] else config["plugins"]["gpt"]["context"]
     initial = f"""
 USER REQUEST: {request}
@@ -174,15 +174,13 @@ Current context: {context}
 User interactions for context (DO NOT USE IF NOT REQUIRED DIRECTLY):
 """
 
-    found = False
     n = 0
-    for event in history:
-        found = True
-        if last_request <= event.timestamp and event.type != "user_request":
+    for event in app.eventLogger.since(last_request):
+        if event.type != app.EventType.USER_REQUEST:
             n += 1
             initial += f"{n}. - " + event.gpt()
 
-    if not found:
+    if not n:
         initial += "No new interactions so far"
 
     return initial
@@ -212,7 +210,7 @@ def open_that_context(request):
 def gpt_callback(**kwargs):
     global gpt_history, last_request
 
-    request = construct(kwargs["context"], kwargs["history"])
+    request = construct(kwargs["context"])
 
     answer = gpt_request(request, [*gpt_start, *gpt_history], gpt_client, gpt_provider, gpt_model)
 
@@ -0,0 +1,155 @@
+"""
+A script that benchmarks command matching (Manager.find) on recorded requests and checks its output against snapshots
+
+Usage:
+    python scripts/py/bench_find.py                 # benchmark and compare both languages with their snapshots
+    python scripts/py/bench_find.py --lang en -n 50 # 50 timed passes over the english requests
+    python scripts/py/bench_find.py --update        # rewrite the snapshots after an intended behaviour change
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import types
+import importlib
+import tracemalloc
+from pathlib import Path
+from types import SimpleNamespace
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent.parent
+BENCH_DIR = PROJECT_DIR / "data" / "benchmarks"
+LANGS = ["en", "ru"]
+
+sys.path.insert(0, str(PROJECT_DIR))
+os.chdir(PROJECT_DIR)
+
+from utils import load_yaml  # noqa: E402
+from app.app import App  # noqa: E402
+
+
+def load_tree_module():
+    """
+    Imports api.commands.tree without running api/__init__.py, which would construct AppAPI together with TTS and audio
+    """
+    package = types.ModuleType("api")
+    package.__path__ = [str(PROJECT_DIR / "api")]
+    sys.modules.setdefault("api", package)
+    return importlib.import_module("api.commands.tree")
+
+
+def build_manager(lang: str):
+    """
+    Registers the command set of a language through App.tree_init, without plugins
+    """
+    tree = load_tree_module()
+    bench_app = App(SimpleNamespace(manager=tree.Manager()))
+    bench_app.config = {
+        "settings": load_yaml(f"{PROJECT_DIR}/config/config.yaml")["settings"],
+        "commands": load_yaml(f"{PROJECT_DIR}/config/langs/{lang}.yaml")["commands"],
+    }
+    bench_app.tree_init()
+    return bench_app.api.manager
+
+
+def load_requests(lang: str):
+    with open(BENCH_DIR / f"requests-{lang}.txt", "r", encoding="utf-8") as file:
+        return [line.strip() for line in file if line.strip() and not line.startswith("#")]
+
+
+def snapshot(manager, requests):
+    """
+    Returns the recognized commands and their context for every request
+    """
+    return {
+        request: [[" ".join(command.keywords), command.action, context] for command, context in manager.find(request)]
+        for request in requests
+    }
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def benchmark(manager, requests, passes: int):
+    for request in requests:  # warm-up
+        manager.find(request)
+
+    timings = []
+    started = time.perf_counter()
+    for _ in range(passes):
+        for request in requests:
+            start = time.perf_counter()
+            manager.find(request)
+            timings.append(time.perf_counter() - start)
+    total = time.perf_counter() - started
+
+    tracemalloc.start()
+    peaks = []
+    for request in requests:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        manager.find(request)
+        peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    tracemalloc.stop()
+
+    return {
+        "requests": len(timings),
+        "p50_us": percentile(timings, 0.5) * 1e6,
+        "p99_us": percentile(timings, 0.99) * 1e6,
+        "throughput": len(timings) / total,
+        "alloc_avg_kib": sum(peaks) / len(peaks) / 1024,
+        "alloc_max_kib": max(peaks) / 1024,
+    }
+
+
+def compare(actual: dict, expected: dict):
+    """
+    Returns the requests whose results differ from the snapshot
+    """
+    return [request for request in actual if actual[request] != expected.get(request)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark and regression check for Manager.find")
+    parser.add_argument("--lang", choices=LANGS, action="append", help="language to run, both by default")
+    parser.add_argument("-n", "--passes", type=int, default=20, help="timed passes over the request corpus")
+    parser.add_argument("--update", action="store_true", help="overwrite the stored snapshots")
+    args = parser.parse_args()
+
+    failed = False
+    for lang in args.lang or LANGS:
+        startup = time.perf_counter()
+        manager = build_manager(lang)
+        startup = time.perf_counter() - startup
+
+        requests = load_requests(lang)
+        stats = benchmark(manager, requests, args.passes)
+        print(f"[{lang}] {len(manager.commands)} commands, tree_init {startup * 1000:.1f} ms")
+        print(f"[{lang}] {stats['requests']} finds: p50 {stats['p50_us']:.1f} us, p99 {stats['p99_us']:.1f} us, "
+              f"{stats['throughput']:.0f} req/s, alloc avg {stats['alloc_avg_kib']:.1f} KiB "
+              f"max {stats['alloc_max_kib']:.1f} KiB")
+
+        snapshot_file = BENCH_DIR / f"snapshot-{lang}.json"
+        actual = snapshot(manager, requests)
+        if args.update or not snapshot_file.exists():
+            with open(snapshot_file, "w", encoding="utf-8") as file:
+                json.dump(actual, file, ensure_ascii=False, indent=2)
+            print(f"[{lang}] snapshot written to {snapshot_file.relative_to(PROJECT_DIR)}")
+            continue
+
+        with open(snapshot_file, "r", encoding="utf-8") as file:
+            expected = json.load(file)
+        mismatches = compare(actual, expected)
+        for request in mismatches:
+            print(f"[{lang}] MISMATCH {request!r}: expected {expected.get(request)}, got {actual[request]}")
+        print(f"[{lang}] snapshot: {len(requests) - len(mismatches)}/{len(requests)} requests match")
+        failed = failed or bool(mismatches)
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -52,4 +52,73 @@ class ValueTracker:
         self.value = [None, ]
 
 
-tracker = ValueTracker()
\ No newline at end of file
+tracker = ValueTracker()
+
+
+class KeywordAutomaton:
+    """
+    Aho-Corasick automaton over word sequences.
+    Finds every occurrence of every phrase in a single pass over the words of a text, on word boundaries.
+    """
+    def __init__(self, phrases=()):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [None]  # (phrase, length in words) of the longest phrase ending in a state
+        self._link = [0]  # nearest state on the failure chain that has an output
+
+        for phrase in phrases:
+            self._add(phrase)
+        self._build()
+
+    def _add(self, phrase):
+        tokens = phrase.lower().split()
+        if not tokens:
+            return
+        state = 0
+        for token in tokens:
+            if token not in self._goto[state]:
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(None)
+                self._link.append(0)
+                self._goto[state][token] = len(self._goto) - 1
+            state = self._goto[state][token]
+        if self._output[state] is None:
+            self._output[state] = (phrase, len(tokens))
+
+    def _build(self):
+        queue = list(self._goto[0].values())  # first-level states fail to the root
+        for state in queue:
+            for token, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and token not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(token, 0)
+                target = self._fail[child]
+                self._link[child] = target if self._output[target] is not None else self._link[target]
+
+    def matches(self, words):
+        """
+        Returns non-overlapping (start, end, phrase) word spans, leftmost first and longest on ties
+        """
+        found = []
+        state = 0
+        for index, word in enumerate(words):
+            token = word.lower()
+            while state and token not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(token, 0)
+
+            match = state if self._output[state] is not None else self._link[state]
+            while match:
+                phrase, length = self._output[match]
+                found.append((index + 1 - length, index + 1, phrase))
+                match = self._link[match]
+
+        found.sort(key=lambda span: (span[0], span[0] - span[1]))
+        spans = []
+        for span in found:
+            if not spans or span[0] >= spans[-1][1]:
+                spans.append(span)
+        return spans